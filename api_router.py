@@ -0,0 +1,319 @@
+#api_router.py
+import json
+import time
+import socket
+import queue
+import threading
+from collections import deque
+from typing import Iterator, Optional, List, Dict
+
+import requests
+
+from utilities.latency_budget import CancelToken
+
+# Per-stage latency budgets (seconds); each can be overridden in config.json
+DEFAULT_LATENCY_BUDGETS = {
+    "stream_connect_timeout_s": 10,   # TCP/TLS connect
+    "stream_idle_timeout_s": 30,      # Max silence between streamed chunks
+    "first_token_budget_s": 30,       # Max wait for the first content token
+    "stream_total_budget_s": 300      # Max duration of a whole response
+}
+
+DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# Request parameters for endpoints that do not set their own
+DEFAULT_REQUEST_PARAMS = {
+    "model": "deepseek-chat",
+    "max_tokens": 8000,
+    "temperature": 0.1
+}
+DEFAULT_ENDPOINTS = [{"name": "deepseek", "url": DEEPSEEK_API_URL, **DEFAULT_REQUEST_PARAMS}]
+
+# --- Hedging configuration ---
+HEDGE_PERCENTILE = 95        # Hedge once the primary is slower than its own p95 TTFT
+HEDGE_MIN_DELAY_S = 0.3      # Never hedge sooner than this
+HEDGE_DEFAULT_DELAY_S = 2.0  # Used until an endpoint has MIN_TTFT_SAMPLES observations
+MIN_TTFT_SAMPLES = 5
+ERROR_COOLDOWN_S = 30        # Endpoints that just failed are tried last for this long
+QUEUE_POLL_S = 0.1           # How often the caller's cancel token is checked while waiting
+
+
+def _iter_sse_content(response: requests.Response) -> Iterator[str]:
+    """Yield content deltas from an OpenAI-compatible chat completion SSE stream."""
+    for line in response.iter_lines():
+        if line:
+            decoded_line = line.decode('utf-8')
+            if decoded_line.startswith('data:'):
+                json_data = decoded_line[5:].strip()
+                if json_data != '[DONE]':
+                    try:
+                        chunk = json.loads(json_data)
+                        if 'choices' in chunk and len(chunk['choices']) > 0:
+                            content = chunk['choices'][0].get('delta', {}).get('content', '')
+                            if content:
+                                yield content
+                    except json.JSONDecodeError:
+                        continue
+
+
+def _configure_endpoints(endpoints: Optional[List[Dict]]) -> List[Dict]:
+    """
+    Validate configured endpoints and fill in request defaults.
+
+    Every endpoint needs a url; its name defaults to the url and must be
+    unique, since per-endpoint statistics are keyed by name.
+    """
+    configured = []
+    for i, endpoint in enumerate(endpoints or DEFAULT_ENDPOINTS):
+        if not endpoint.get("url"):
+            raise ValueError(f"api_endpoints[{i}] has no 'url'")
+        endpoint = {**DEFAULT_REQUEST_PARAMS, **endpoint}
+        endpoint.setdefault("name", endpoint["url"])
+        if any(other["name"] == endpoint["name"] for other in configured):
+            raise ValueError(f"api_endpoints[{i}] reuses the name '{endpoint['name']}'")
+        configured.append(endpoint)
+    return configured
+
+
+class EndpointStats:
+    """Rolling time-to-first-token and error statistics for one endpoint."""
+
+    def __init__(self, window: int = 200):
+        self.ttft = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.last_error_time = 0.0
+        self._lock = threading.Lock()
+
+    def record_ttft(self, seconds: float) -> None:
+        with self._lock:
+            self.ttft.append(seconds)
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+            self.last_error_time = time.monotonic()
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.ttft)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    def summary(self) -> Dict:
+        p50, p99 = self.percentile(50), self.percentile(99)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "ttft_p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "ttft_p99_ms": round(p99 * 1000) if p99 is not None else None
+        }
+
+
+class _Attempt:
+    """One in-flight streaming request to one endpoint, run on its own thread."""
+
+    def __init__(self, endpoint: Dict, events: "queue.Queue"):
+        self.endpoint = endpoint
+        self.events = events
+        self.cancel_token = CancelToken()
+        self.started = time.monotonic()
+        self.response: Optional[requests.Response] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def cancel(self) -> None:
+        """
+        Stop the attempt without blocking the caller.
+
+        Closing a response from another thread waits for the worker's pending
+        read, so instead the socket is shut down: the worker's read fails at
+        once and the worker closes the response itself, releasing the pooled
+        connection slot.
+        """
+        self.cancel_token.cancel("hedge lost")
+        response = self.response
+        if response is None:
+            return
+        connection = getattr(response.raw, "_connection", None)  # urllib3 >= 2
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class EndpointRouter:
+    """
+    Routes chat completions across OpenAI-compatible endpoints.
+
+    The endpoint with the best recent time-to-first-token and error record is
+    the primary. If the primary has not produced a token within its own
+    HEDGE_PERCENTILE TTFT, a duplicate request goes to the next endpoint. The
+    first stream to produce a token wins and the other is cancelled. A failed
+    attempt fails over to the next untried endpoint.
+    """
+
+    def __init__(self, endpoints: Optional[List[Dict]] = None, session: Optional[requests.Session] = None,
+                 budgets: Optional[Dict[str, float]] = None):
+        self.endpoints = _configure_endpoints(endpoints)
+        self.session = session or requests.Session()
+        self.budgets = {**DEFAULT_LATENCY_BUDGETS, **(budgets or {})}
+        self.stats = {e["name"]: EndpointStats() for e in self.endpoints}
+
+    # --- Endpoint selection ---
+    def ranked_endpoints(self) -> List[Dict]:
+        """Endpoints ordered best first by median TTFT, penalised for errors."""
+        now = time.monotonic()
+
+        def score(endpoint: Dict) -> tuple:
+            stats = self.stats[endpoint["name"]]
+            cooling_down = now - stats.last_error_time < ERROR_COOLDOWN_S if stats.errors else False
+            p50 = stats.percentile(50)
+            p50 = HEDGE_DEFAULT_DELAY_S if p50 is None else p50
+            return (cooling_down, p50 * (1.0 + 4.0 * stats.error_rate()))
+
+        return sorted(self.endpoints, key=score)
+
+    def hedge_delay(self, endpoint: Dict) -> float:
+        """How long to wait for the first token before sending a hedged request."""
+        stats = self.stats[endpoint["name"]]
+        if len(stats.ttft) < MIN_TTFT_SAMPLES:
+            return HEDGE_DEFAULT_DELAY_S
+        return max(HEDGE_MIN_DELAY_S, stats.percentile(HEDGE_PERCENTILE))
+
+    # --- Attempts ---
+    def _run_attempt(self, attempt: _Attempt, history: List[Dict[str, str]], api_key: str) -> None:
+        """Worker thread: stream one endpoint and forward events to the router queue."""
+        endpoint = attempt.endpoint
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+        # The global (DeepSeek) key is only ever sent to the DeepSeek API itself
+        key = endpoint.get("api_key") or (api_key if endpoint["url"] == DEEPSEEK_API_URL else None)
+        if key:
+            headers["Authorization"] = f"Bearer {key}"
+        data = {
+            "model": endpoint["model"],
+            "messages": history,
+            "stream": True,
+            "max_tokens": endpoint["max_tokens"],
+            "temperature": endpoint["temperature"]
+        }
+        self.stats[endpoint["name"]].record_request()
+        try:
+            with self.session.post(endpoint["url"], headers=headers, json=data, stream=True,
+                                   timeout=(self.budgets["stream_connect_timeout_s"],
+                                            self.budgets["stream_idle_timeout_s"])) as response:
+                attempt.response = response
+                if attempt.cancel_token.cancelled:
+                    return
+                response.raise_for_status()
+                for content in _iter_sse_content(response):
+                    if attempt.cancel_token.cancelled:
+                        return
+                    attempt.events.put((attempt, "chunk", content))
+            attempt.events.put((attempt, "done", None))
+        except Exception as e:
+            if not attempt.cancel_token.cancelled:
+                self.stats[endpoint["name"]].record_error()
+                attempt.events.put((attempt, "error", e))
+
+    def _start_attempt(self, endpoint: Dict, events: "queue.Queue", history: List[Dict[str, str]],
+                       api_key: str) -> _Attempt:
+        attempt = _Attempt(endpoint, events)
+        attempt.thread = threading.Thread(target=self._run_attempt, args=(attempt, history, api_key),
+                                          daemon=True, name=f"stream-{endpoint['name']}")
+        attempt.thread.start()
+        return attempt
+
+    # --- Public streaming interface ---
+    def stream(self, history: List[Dict[str, str]], api_key: str,
+               cancel_token: Optional[CancelToken] = None) -> Iterator[str]:
+        """
+        Stream a completion, hedging and failing over across endpoints.
+
+        Yields content chunks from the winning endpoint only. Errors when every
+        endpoint failed are yielded as "\\nAPI request failed: ..." like before.
+        Closing the generator cancels every in-flight attempt.
+        """
+        cancel_token = cancel_token or CancelToken()
+        events: "queue.Queue" = queue.Queue()
+        pending = self.ranked_endpoints()
+        active: List[_Attempt] = []
+        winner: Optional[_Attempt] = None
+        last_error: Optional[Exception] = None
+        started = time.monotonic()
+
+        active.append(self._start_attempt(pending.pop(0), events, history, api_key))
+        hedge_at = started + self.hedge_delay(active[0].endpoint)
+
+        try:
+            while True:
+                now = time.monotonic()
+                if winner is None and now - started > self.budgets["first_token_budget_s"]:
+                    cancel_token.cancel("first-token deadline")
+                elif now - started > self.budgets["stream_total_budget_s"]:
+                    cancel_token.cancel("response deadline")
+                if cancel_token.cancelled:
+                    return
+
+                # Hedge: the primary is slower than usual and another endpoint is available
+                if winner is None and pending and now >= hedge_at:
+                    active.append(self._start_attempt(pending.pop(0), events, history, api_key))
+                    hedge_at = float('inf')
+
+                try:
+                    attempt, kind, payload = events.get(timeout=QUEUE_POLL_S)
+                except queue.Empty:
+                    continue
+                if winner is not None and attempt is not winner:
+                    continue  # Late events from a cancelled loser
+                if attempt.cancel_token.cancelled:
+                    continue
+
+                if kind == "chunk":
+                    if winner is None:
+                        winner = attempt
+                        self.stats[attempt.endpoint["name"]].record_ttft(time.monotonic() - attempt.started)
+                        for other in active:
+                            if other is not winner:
+                                # A loser that started first (a stalled primary) waited longer than the
+                                # winner's TTFT, so its wait is a fair lower bound; a later hedge's is not
+                                if other.started < attempt.started:
+                                    self.stats[other.endpoint["name"]].record_ttft(time.monotonic() - other.started)
+                                other.cancel()
+                    yield payload
+                elif kind == "done":
+                    if winner is None:
+                        winner = attempt  # Completed without content - nothing to hedge against
+                    return
+                elif kind == "error":
+                    last_error = payload
+                    active.remove(attempt)
+                    if winner is attempt:
+                        yield f"\nAPI request failed: {payload}"
+                        return
+                    if not active:
+                        if not pending:
+                            yield f"\nAPI request failed: {last_error}"
+                            return
+                        # Fail over immediately rather than waiting for the hedge delay
+                        active.append(self._start_attempt(pending.pop(0), events, history, api_key))
+                        hedge_at = time.monotonic() + self.hedge_delay(active[-1].endpoint)
+        finally:
+            for attempt in active:
+                attempt.cancel()
+
+    def stats_summary(self) -> Dict[str, Dict]:
+        """Per-endpoint request, error and TTFT statistics."""
+        return {name: stats.summary() for name, stats in self.stats.items()}
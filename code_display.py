@@ -0,0 +1,246 @@
+#code_display.py
+import re
+import sys
+import hashlib
+from collections import OrderedDict
+from typing import List, Dict
+
+import pyperclip
+
+# ==============================================
+# Rich Display Module for code blocks
+# ==============================================
+try:
+    from rich.syntax import Syntax
+    from rich.console import Console
+    from rich.theme import Theme
+    RICH_AVAILABLE = True
+    # Define custom theme with black background
+    # Force true black background (RGB: 0,0,0)
+    custom_theme = Theme({
+        "background": "on #000000",  # True black
+        "code": "white on #000000",
+        "keyword": "bold #56B6C2",    # Cyan
+        "string": "#98C379",          # Green
+        "number": "#D19A66",          # Orange
+        "comment": "italic #5C6370",  # Gray
+    })
+
+    console = Console(theme=custom_theme)
+
+    # Built-in dark themes available in Rich:
+    # "monokai", "native", "fruity", "perldoc", "tango", "rrt", "xcode"
+    SYNTAX_THEME = "monokai"  # The best dark theme option
+
+except ImportError:
+    RICH_AVAILABLE = False
+
+# Opening fence with an optional language tag
+FENCE_OPEN = re.compile(r'^```([a-zA-Z0-9\+]*)$')
+FENCE_CLOSE = '```'
+
+RENDER_CACHE_SIZE = 128  # Rendered /show pages kept for free redraws
+
+dark_blue_bg = "\033[48;2;0;0;95m"
+white_text = "\033[38;2;255;255;255m"
+reset = "\033[0m"
+
+
+class StreamingCodeRenderer:
+    """
+    Prints a streamed response, syntax highlighting fenced code blocks as
+    their lines arrive instead of after the whole response.
+
+    Plain text is written through as it streams. Code lines are highlighted in
+    batches (the whole block so far is lexed so multi-line strings and comments
+    stay correct, but only new lines are printed). Rendered /show pages are
+    cached by content hash, so redraws are free. Blocks longer than
+    collapse_lines are collapsed after that point and can be paged with
+    /show. /copy and /show are handled at the next prompt, so nothing blocks
+    between responses.
+    """
+
+    def __init__(self, use_rich: bool = RICH_AVAILABLE, collapse_lines: int = 120,
+                 page_lines: int = 60, batch_lines: int = 8):
+        self.use_rich = use_rich and RICH_AVAILABLE
+        self.collapse_lines = collapse_lines
+        self.page_lines = page_lines
+        self.batch_lines = batch_lines
+        self.blocks: List[Dict[str, str]] = []
+        self._render_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.start_response()
+
+    # --- Output helpers ---
+    def _write(self, text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def _render(self, lines: List[str], language: str, start: int, end: int, line_numbers: bool = False,
+                cache: bool = False) -> str:
+        """
+        ANSI rendering of lines[start:end] (0-based). With cache=True (/show
+        pages) the result is kept by content hash; streaming batches are drawn
+        once, so caching them would only hold memory.
+        """
+        if not self.use_rich:
+            return "".join(line + "\n" for line in lines[start:end])
+        # Lexing depends only on the lines up to `end`, so that prefix is the cache key
+        code = "\n".join(lines[:end])
+        key = None
+        if cache:
+            key = hashlib.sha1(
+                f"{language}\0{start}\0{end}\0{line_numbers}\0{console.width}\0{code}".encode('utf-8')
+            ).hexdigest()
+            rendered = self._render_cache.get(key)
+            if rendered is not None:
+                self._render_cache.move_to_end(key)
+                return rendered
+        syntax = Syntax(
+            code,
+            language,
+            theme=SYNTAX_THEME,
+            background_color="#000000",  # Force black background
+            line_numbers=line_numbers,
+            line_range=(start + 1, end),
+            word_wrap=True
+        )
+        with console.capture() as capture:
+            console.print(syntax)
+        rendered = capture.get()
+        if key is not None:
+            self._render_cache[key] = rendered
+            if len(self._render_cache) > RENDER_CACHE_SIZE:
+                self._render_cache.popitem(last=False)
+        return rendered
+
+    def clear_cache(self) -> None:
+        """Drop cached renders (used by the memory monitor when near the budget)."""
+        self._render_cache.clear()
+
+    # --- Streaming ---
+    def start_response(self) -> None:
+        """Reset parsing state for a new response (blocks are kept until new code arrives)."""
+        self._pending = ""        # Current incomplete line
+        self._printed = 0         # Characters of _pending already written
+        self._in_code = False
+        self._language = "text"
+        self._lines: List[str] = []
+        self._rendered = 0        # Lines of the current block already written
+        self._collapsed = False
+        self._fresh = True        # First block of this response replaces the previous response's blocks
+
+    def feed(self, chunk: str) -> None:
+        """Consume one streamed chunk."""
+        self._pending += chunk
+        while "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            self._handle_line(line)
+            self._printed = 0
+        # Write partial text lines immediately unless they might turn into a fence
+        if not self._in_code and not self._could_be_fence(self._pending):
+            self._write(self._pending[self._printed:])
+            self._printed = len(self._pending)
+
+    def finish(self) -> None:
+        """Flush whatever is left when the stream ends (or is cancelled)."""
+        if self._pending:
+            self.feed("\n")
+        if self._in_code:
+            self._close_block()
+
+    @staticmethod
+    def _could_be_fence(partial: str) -> bool:
+        stripped = partial.lstrip()
+        return stripped == "" or stripped.startswith(FENCE_CLOSE) or FENCE_CLOSE.startswith(stripped)
+
+    def _handle_line(self, line: str) -> None:
+        if not self._in_code:
+            match = FENCE_OPEN.match(line.strip()) if self._printed == 0 else None
+            if match:
+                self._open_block(match.group(1) or "text")
+            else:
+                self._write(line[self._printed:] + "\n")
+            return
+        if line.strip() == FENCE_CLOSE:
+            self._close_block()
+            return
+        self._lines.append(line)
+        # Batches grow with the block so re-lexing the prefix stays roughly linear overall
+        batch = max(self.batch_lines, self._rendered // 4)
+        if not self._collapsed and len(self._lines) - self._rendered >= batch:
+            self._flush_lines()
+
+    def _open_block(self, language: str) -> None:
+        if self._fresh:
+            self.blocks = []
+            self._fresh = False
+        self._in_code = True
+        self._language = language
+        self._lines = []
+        self._rendered = 0
+        self._collapsed = False
+        self._write(f"\n{'━'*30}\nCode Block {len(self.blocks) + 1} [{language}]\n")
+
+    def _flush_lines(self) -> None:
+        """Write pending block lines, collapsing the rest once the block gets long."""
+        end = min(len(self._lines), self.collapse_lines)
+        if end > self._rendered:
+            self._write(self._render(self._lines, self._language, self._rendered, end))
+            self._rendered = end
+        if len(self._lines) > self.collapse_lines and not self._collapsed:
+            self._collapsed = True
+            self._write(f"  … block collapsed after {self.collapse_lines} lines (still streaming)\n")
+
+    def _close_block(self) -> None:
+        self._flush_lines()
+        self._in_code = False
+        content = "\n".join(self._lines).strip()
+        if not content:
+            self._write(f"{'━'*30}\n")
+            return
+        self.blocks.append({'language': self._language, 'content': content})
+        number = len(self.blocks)
+        hidden = len(self._lines) - self._rendered
+        if hidden > 0:
+            self._write(f"  [{hidden} more lines hidden - /show {number} to page through the block]\n")
+        self._write(f"{dark_blue_bg}{white_text}📋 [Type /copy {number} at the prompt to copy this block]{reset}\n")
+        self._write(f"{'━'*30}\n")
+
+    # --- Prompt commands ---
+    def show_block(self, number: int, page: int = 1) -> None:
+        """Print one page of a block with line numbers."""
+        lines = self.blocks[number - 1]['content'].split("\n")
+        pages = max(1, -(-len(lines) // self.page_lines))
+        page = min(max(page, 1), pages)
+        start = (page - 1) * self.page_lines
+        end = min(start + self.page_lines, len(lines))
+        self._write(f"\nCode Block {number} - page {page}/{pages} (lines {start + 1}-{end})\n")
+        self._write(self._render(lines, self.blocks[number - 1]['language'], start, end,
+                                 line_numbers=True, cache=True))
+        if page < pages:
+            self._write(f"[/show {number} {page + 1} for the next page]\n")
+
+    def copy_block(self, number: int) -> None:
+        try:
+            pyperclip.copy(self.blocks[number - 1]['content'])
+            print(f"✓ Copied Block {number}!")
+        except Exception as e:
+            print(f"⚠️ Could not copy Block {number}: {e}")
+
+    def handle_command(self, text: str) -> bool:
+        """
+        Handle '/copy N' and '/show N [page]'. Returns True if text was one of
+        these commands (whether or not it succeeded).
+        """
+        parts = text.strip().split()
+        if not parts or parts[0].lower() not in ('/copy', '/show'):
+            return False
+        if len(parts) < 2 or not parts[1].isdigit() or not 0 < int(parts[1]) <= len(self.blocks):
+            print(f"No such code block (last response had {len(self.blocks)})")
+            return True
+        if parts[0].lower() == '/copy':
+            self.copy_block(int(parts[1]))
+        else:
+            page = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1
+            self.show_block(int(parts[1]), page)
+        return True
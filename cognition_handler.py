@@ -1,10 +1,13 @@
 import os
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 import chromadb
+from chromadb.config import Settings
 from chromadb.utils import embedding_functions
 from utilities.setup_config import ensure_config
+from utilities.dedup_index import DedupIndex, content_hash
 import nltk
 from nltk import word_tokenize
 from nltk.util import ngrams
@@ -16,24 +19,71 @@ class ResponseHandler:
         self.assistant_name = "Assistant"
         
         # Initialize ChromaDB
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+        self.db_path = "./chroma_db"
+        self.client = chromadb.PersistentClient(path=self.db_path, settings=self._client_settings())
+        self.embedding_model_name = "all-MiniLM-L6-v2"
         self.sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2"
+            model_name=self.embedding_model_name
         )
         
-        self.collection = self.client.get_or_create_collection(
-            name="chat_responses",
-            embedding_function=self.sentence_transformer_ef,
-            metadata={"hnsw:space": "cosine"}
-        )
+        # HNSW index parameters, e.g. {"M": 16, "construction_ef": 200, "search_ef": 50}
+        # (see utilities/hnsw_benchmark.py). M and construction_ef apply to newly created
+        # shards, search_ef to every shard; unset keys keep Chroma's defaults
+        self.hnsw_params = self.config.get('hnsw_params', {})
+
+        # Time-partitioned memory shards: chat_responses_<period start>, plus the
+        # legacy un-suffixed chat_responses collection treated as the oldest shard
+        self.shard_prefix = "chat_responses"
+        self.shard_period = self.config.get('memory_shard_period', 'month')  # 'day', 'week' or 'month'
+        self._shards = {}  # Shard name -> collection handle, opened lazily on first use
+        self._shard_names = self._list_shard_names()
+        self.shard_workers = self.config.get('memory_shard_workers', 4)
+        self._shard_pool = ThreadPoolExecutor(max_workers=self.shard_workers, thread_name_prefix="shard-query")
+
+        # Recency weighting and early stopping for recall across shards
+        self.recency_half_life_days = self.config.get('memory_recency_half_life_days', 30)
+        self.recency_floor = self.config.get('memory_recency_floor', 0.7)  # Weight never decays below this
+        self.early_stop_similarity = self.config.get('memory_early_stop_similarity', 0.6)
+
+        # Collection currently written to
+        self.collection = self._get_shard(self._current_shard_name(), create=True)
+
+        # Write-time dedup: repeated chunks are linked to the existing vector instead of re-embedded
+        self.dedup_index = DedupIndex(os.path.join(self.db_path, "dedup_index.sqlite3"))
+        if len(self.dedup_index) == 0:
+            self.rebuild_dedup_index()
+        self.recall_overfetch = self.config.get('recall_overfetch', 2)  # Candidates fetched per requested result
+
+        # Ingested reference documents live in their own collection, separate from chat memory
+        self.documents_collection_name = self.config.get('documents_collection', 'documents')
+        self._documents = None  # Opened lazily; stays None until something is ingested
         
         # Chunking configuration
         self.sentence_window = 3  # Number of sentences per chunk
         self.sentence_overlap = 1  # Number of overlapping sentences between chunks
 
+        # Multi-query fusion configuration
+        self.rrf_k = 60  # Reciprocal rank damping constant for the multi-query agreement bonus
+        self.expansion_weight = self.config.get('query_expansion_weight', 0.7)  # Weight of derived sub-queries
+
         # Download NLTK data if not already present
         nltk.download('punkt', quiet=True)
 
+    def _client_settings(self) -> Settings:
+        """
+        Chroma settings. Under a memory_budget_mb, loaded segments (HNSW graphs)
+        are kept in an LRU cache bounded to vector_cache_mb (default: a quarter
+        of the budget) instead of staying resident for every shard ever queried.
+        """
+        budget_mb = self.config.get('memory_budget_mb')
+        if not budget_mb:
+            return Settings()
+        cache_mb = self.config.get('vector_cache_mb', budget_mb / 4)
+        return Settings(
+            chroma_segment_cache_policy="LRU",
+            chroma_memory_limit_bytes=int(cache_mb * 1024 * 1024)
+        )
+
     def _extract_sentences(self, text: str) -> List[str]:
         """Split text into sentences using regex."""
         sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s', text)
@@ -53,6 +103,220 @@ class ResponseHandler:
         """Generate ISO format timestamp."""
         return datetime.now().isoformat()
 
+    def _current_shard_name(self) -> str:
+        """Name of the shard covering the current time period."""
+        now = datetime.now()
+        if self.shard_period == 'day':
+            suffix = now.strftime('%Y_%m_%d')
+        elif self.shard_period == 'week':
+            suffix = (now - timedelta(days=now.weekday())).strftime('%Y_%m_%d')
+        else:
+            suffix = now.strftime('%Y_%m')
+        return f"{self.shard_prefix}_{suffix}"
+
+    def _list_shard_names(self) -> List[str]:
+        """All memory shards in the store, newest period first."""
+        names = []
+        for collection in self.client.list_collections():
+            name = getattr(collection, 'name', collection)  # Older Chroma returns objects, newer returns names
+            if name == self.shard_prefix or name.startswith(f"{self.shard_prefix}_"):
+                names.append(name)
+        # Period suffixes sort chronologically; the legacy un-suffixed collection sorts last
+        return sorted(names, reverse=True)
+
+    def _collection_metadata(self) -> Dict:
+        """
+        Collection metadata for new shards. HNSW build parameters (M,
+        construction_ef) are fixed once a collection exists, so tuned values
+        take effect from the next shard; search_ef is also applied to existing
+        shards by _apply_search_ef.
+        """
+        metadata = {"hnsw:space": "cosine"}
+        for key in ("M", "construction_ef", "search_ef"):
+            if key in self.hnsw_params:
+                metadata[f"hnsw:{key}"] = int(self.hnsw_params[key])
+        return metadata
+
+    def _get_shard(self, name: str, create: bool = False, metadata: Optional[Dict] = None):
+        """
+        Return the collection handle for a shard, opening (or creating) it on first use.
+        A new shard gets `metadata` if given (e.g. restored by an import), else the
+        configured defaults.
+        """
+        shard = self._shards.get(name)
+        if shard is None:
+            if create:
+                shard = self.client.get_or_create_collection(
+                    name=name,
+                    embedding_function=self.sentence_transformer_ef,
+                    metadata=metadata or self._collection_metadata()
+                )
+                if name not in self._shard_names:
+                    self._shard_names = sorted(self._shard_names + [name], reverse=True)
+            else:
+                shard = self.client.get_collection(name=name, embedding_function=self.sentence_transformer_ef)
+            self._apply_search_ef(shard)
+            self._shards[name] = shard
+        return shard
+
+    def _apply_search_ef(self, collection) -> None:
+        """
+        search_ef is a query-time setting that Chroma lets existing collections
+        change, so a tuned value applies to every shard, not only new ones.
+        """
+        if "search_ef" not in self.hnsw_params:
+            return
+        search_ef = int(self.hnsw_params["search_ef"])
+        try:
+            hnsw = (getattr(collection, 'configuration', None) or {}).get('hnsw') or {}
+            if hnsw.get('ef_search') != search_ef:
+                collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+        except Exception as e:
+            print(f"[Recall Warning] Could not apply search_ef to {collection.name}: {e}")
+
+    def evict_caches(self) -> None:
+        """
+        Release the dedup index's SQLite page cache. Chroma's segment caches are
+        not reachable from here - they are bounded by the LRU limit set in
+        _client_settings instead.
+        """
+        self.dedup_index.shrink_memory()
+
+    def _recency_weight(self, timestamp: Optional[str]) -> float:
+        """Exponential decay on a chunk's age, bounded below by recency_floor."""
+        try:
+            age_days = (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+        except (TypeError, ValueError):
+            return self.recency_floor
+        decay = 0.5 ** (max(age_days, 0.0) / self.recency_half_life_days)
+        return self.recency_floor + (1.0 - self.recency_floor) * decay
+
+    def _query_shard(self, name: str, query_embeddings: List, n_results: int) -> Optional[Dict]:
+        """Query one shard; failures are reported and treated as no results."""
+        try:
+            return self._get_shard(name).query(query_embeddings=query_embeddings, n_results=n_results)
+        except Exception as e:
+            print(f"[Recall Warning] Shard {name} could not be queried: {e}")
+            return None
+
+    def _merge_shard_results(self, shard_results: List[Dict], num_queries: int, n_results: int) -> Dict:
+        """
+        Combine per-shard query results into one result set shaped like a single
+        collection.query response, keeping the n_results nearest hits per query.
+        """
+        merged = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        for q in range(num_queries):
+            hits = []
+            for result in shard_results:
+                if not result or not result.get('ids') or q >= len(result['ids']):
+                    continue
+                hits.extend(zip(result['distances'][q], result['ids'][q],
+                                result['documents'][q], result['metadatas'][q]))
+            hits.sort(key=lambda hit: hit[0])
+            hits = hits[:n_results]
+            merged['distances'].append([hit[0] for hit in hits])
+            merged['ids'].append([hit[1] for hit in hits])
+            merged['documents'].append([hit[2] for hit in hits])
+            merged['metadatas'].append([hit[3] for hit in hits])
+        return merged
+
+    def _query_shards(self, queries: List[str], n_results: int, enough_hits: int) -> Dict:
+        """
+        Fan the queries out over the shards, newest first, in waves of shard_workers
+        concurrent queries. Queries are embedded once and reused for every shard.
+        Stops before older waves once enough_hits results reach early_stop_similarity.
+        """
+        query_embeddings = self.sentence_transformer_ef(queries)
+        shard_results = []
+        names = list(self._shard_names)
+        for start in range(0, len(names), self.shard_workers):
+            wave = names[start:start + self.shard_workers]
+            futures = [self._shard_pool.submit(self._query_shard, name, query_embeddings, n_results)
+                       for name in wave]
+            shard_results.extend(future.result() for future in futures)
+
+            strong_ids = set()
+            for result in shard_results:
+                if not result or not result.get('ids'):
+                    continue
+                for ids, distances in zip(result['ids'], result['distances']):
+                    strong_ids.update(doc_id for doc_id, distance in zip(ids, distances)
+                                      if 1.0 - distance >= self.early_stop_similarity)
+            if len(strong_ids) >= enough_hits:
+                break
+        return self._merge_shard_results(shard_results, len(queries), n_results)
+
+    def _dedup_scope(self, metadata: Dict) -> str:
+        """Chunks only count as duplicates when the same speaker said them in the same role."""
+        return f"{metadata.get('content_type', 'unknown')}:{metadata.get('speaker', '')}"
+
+    def register_chunks(self, shard_name: str, documents: List[str], metadatas: List[Dict], ids: List[str]) -> None:
+        """Add chunks that were written to a shard to the dedup index."""
+        self.dedup_index.add_many(
+            (document, self._dedup_scope(metadata or {}), shard_name, doc_id)
+            for document, metadata, doc_id in zip(documents, metadatas, ids)
+            if document
+        )
+
+    def rebuild_dedup_index(self, page_size: int = 5000) -> None:
+        """Index every chunk already in the store (used once for stores created before dedup)."""
+        total = 0
+        for name in self._shard_names:
+            shard = self._get_shard(name)
+            count = shard.count()
+            for offset in range(0, count, page_size):
+                page = shard.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                self.register_chunks(name, page["documents"], page["metadatas"], page["ids"])
+            total += count
+        if total:
+            print(f"[Storage] Indexed {total} existing chunks for deduplication")
+
+    def _link_duplicates(self, documents: List[str], metadatas: List[Dict], ids: List[str],
+                         timestamp: str) -> tuple:
+        """
+        Split a turn's chunks into new ones and repeats of content already stored.
+
+        Repeats (exact or near-duplicate within the same scope) are not inserted;
+        the existing chunk's hit_count is incremented and last_seen moved to this
+        turn. Returns the (documents, metadatas, ids) that still need inserting.
+        """
+        new_chunks = []
+        links = {}  # shard -> {existing doc_id: (document, metadata, new doc_id)}
+        seen_this_turn = set()
+        for document, metadata, doc_id in zip(documents, metadatas, ids):
+            scope = self._dedup_scope(metadata)
+            key = content_hash(document, scope)
+            if key in seen_this_turn:
+                continue  # Overlapping windows can repeat within a single turn
+            seen_this_turn.add(key)
+            existing = self.dedup_index.find(document, scope)
+            if existing:
+                links.setdefault(existing[0], {})[existing[1]] = (document, metadata, doc_id)
+            else:
+                new_chunks.append((document, metadata, doc_id))
+
+        for shard_name, linked in links.items():
+            try:
+                shard = self._get_shard(shard_name)
+                found = shard.get(ids=list(linked), include=["metadatas"])
+            except Exception:
+                found = {"ids": [], "metadatas": []}
+            updated_ids, updated_metadatas = [], []
+            for existing_id, existing_metadata in zip(found["ids"], found["metadatas"]):
+                existing_metadata = dict(existing_metadata or {})
+                existing_metadata["hit_count"] = existing_metadata.get("hit_count", 1) + 1
+                existing_metadata["last_seen"] = timestamp
+                updated_ids.append(existing_id)
+                updated_metadatas.append(existing_metadata)
+            if updated_ids:
+                shard.update(ids=updated_ids, metadatas=updated_metadatas)
+            # Chunks the index points at but the store no longer has are stored afresh
+            for missing_id in set(linked) - set(updated_ids):
+                self.dedup_index.remove(shard_name, missing_id)
+                new_chunks.append(linked[missing_id])
+
+        return ([c[0] for c in new_chunks], [c[1] for c in new_chunks], [c[2] for c in new_chunks])
+
     def _calculate_ngram_similarity(self, text1: str, text2: str, n: int = 2) -> float:
         """Calculate ngram similarity between two texts."""
         tokens1 = word_tokenize(text1.lower())
@@ -129,22 +393,71 @@ class ResponseHandler:
                     all_metadatas.append(metadata)
                     all_ids.append(doc_id)
 
-            # --- Store combined chunks in ChromaDB ---
+            # --- Link repeated content to existing chunks instead of inserting it again ---
+            if all_documents:
+                try:
+                    all_documents, all_metadatas, all_ids = self._link_duplicates(
+                        all_documents, all_metadatas, all_ids, turn_timestamp
+                    )
+                except Exception as e:
+                    print(f"[Storage Warning] Deduplication skipped for turn {turn_timestamp}: {e}")
+
+            # --- Store combined chunks in the current period's shard ---
             if all_documents:
                 try:
+                    shard_name = self._current_shard_name()
+                    self.collection = self._get_shard(shard_name, create=True)
                     self.collection.add(
                         documents=all_documents,
                         metadatas=all_metadatas,
                         ids=all_ids
                     )
+                    self.register_chunks(shard_name, all_documents, all_metadatas, all_ids)
                     # Optional: Add a print statement for confirmation/debugging
                     # print(f"[Storage] Added {len(prompt_chunks) if prompt and prompt.strip() else 0} prompt and {len(response_chunks) if response and response.strip() else 0} response chunks for turn {turn_timestamp}.")
                 except Exception as e:
                     print(f"[Storage Error] Failed to add documents for turn {turn_timestamp}: {e}")
                     # Consider logging more details if errors occur frequently
-    def recall_memory(self, query_text: str, max_results: int = 3, min_similarity: float = 0.2) -> List[Dict]:
+    def _fuse_query_results(self, results: Dict, weights: List[float]) -> List[Dict]:
+        """
+        Merge the per-query result lists of a batched query, de-duplicating by
+        chunk ID. A chunk's fused score is its best query-weighted similarity
+        plus a small reciprocal-rank bonus for every other query that found it,
+        so chunks several sub-queries agree on rise without drowning out the
+        similarity scale that recency weighting is applied to.
+
+        Returns:
+            Candidates ordered by fused score, each with document, metadata and
+            the best cosine similarity any query achieved for that chunk.
         """
-        Recalls relevant memories from ChromaDB.
+        candidates = {}
+        for q, ids in enumerate(results.get('ids') or []):
+            for rank, doc_id in enumerate(ids):
+                similarity = 1.0 - results['distances'][q][rank] # Convert distance to similarity
+                candidate = candidates.get(doc_id)
+                if candidate is None:
+                    candidate = candidates[doc_id] = {
+                        'document': results['documents'][q][rank],
+                        'metadata': results['metadatas'][q][rank],
+                        'similarity': similarity,
+                        'best_weighted': 0.0,
+                        'rank_bonus': 0.0
+                    }
+                candidate['similarity'] = max(candidate['similarity'], similarity)
+                candidate['best_weighted'] = max(candidate['best_weighted'], weights[q] * similarity)
+                candidate['rank_bonus'] += weights[q] / (self.rrf_k + rank + 1)
+
+        for candidate in candidates.values():
+            candidate['fused'] = candidate['best_weighted'] + candidate['rank_bonus']
+
+        return sorted(candidates.values(), key=lambda c: c['fused'], reverse=True)
+
+    def recall_memory(self, query_text: str, max_results: int = 3, min_similarity: float = 0.2,
+                      expansions: Optional[List[str]] = None,
+                      exclude_texts: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Recalls relevant memories from the ChromaDB shards, weighting results
+        towards recent conversations.
 
         Modifies the 'content' field in results to be:
         'speaker[timestamp]: original_content'
@@ -153,37 +466,67 @@ class ResponseHandler:
             query_text: The text to search for.
             max_results: Maximum number of results to return.
             min_similarity: Minimum similarity score (0-1) for results.
+            expansions: Optional extra sub-queries (e.g. derived from recent turns).
+                        They are embedded and searched in the same batched query
+                        as query_text and their results fused with its own.
+            exclude_texts: Optional texts (e.g. messages still in the live chat
+                        history) whose chunks are skipped - the model already
+                        sees them, so recalling them only wastes result slots.
 
         Returns:
-            List of dictionaries containing formatted content, metadata, and similarity score.
+            List of dictionaries containing formatted content, metadata, similarity score
+            and 'relevance' (fused across all queries, scaled by recency), ordered by
+            relevance.
         """
 
         if not query_text.strip():
             return []
 
-        # Get initial results
-        initial_results = self.collection.query(
-            query_texts=[query_text],
-            n_results=max(10, max_results * 3) # Fetch extra for filtering
+        queries = [query_text]
+        for expansion in expansions or []:
+            if expansion and expansion.strip() and expansion not in queries:
+                queries.append(expansion)
+        # The user's own words stay the strongest signal
+        weights = [1.0] + [self.expansion_weight] * (len(queries) - 1)
+
+        # Get initial results for every query across the shards
+        initial_results = self._query_shards(
+            queries,
+            n_results=max(5, max_results * self.recall_overfetch), # Fetch a little extra for filtering
+            enough_hits=max_results
         )
 
         # Handle cases where query returns nothing or malformed results
-        if not initial_results or not initial_results.get('ids') or not initial_results['ids'][0]:
+        if not initial_results or not initial_results.get('ids') or not any(initial_results['ids']):
             return []
 
+        candidates = self._fuse_query_results(initial_results, weights)
+        for candidate in candidates:
+            metadata = candidate['metadata']
+            # Content repeated recently counts as recent even if first stored long ago
+            candidate['fused'] *= self._recency_weight(metadata.get('last_seen') or metadata.get('timestamp'))
+        candidates.sort(key=lambda c: c['fused'], reverse=True)
+        # Chunks are sentence windows of the stored text, so compare with whitespace collapsed
+        live_texts = [' '.join(text.split()) for text in exclude_texts or [] if text]
+
         # Process and filter results
         filtered_results = []
 
-        for i in range(len(initial_results['ids'][0])):
-            original_content = initial_results['documents'][0][i]
-            metadata = initial_results['metadatas'][0][i]
-            distance = initial_results['distances'][0][i]
-            similarity = 1.0 - distance # Convert distance to similarity
+        for candidate in candidates:
+            original_content = candidate['document']
+            metadata = candidate['metadata']
+            similarity = candidate['similarity']
 
             # Filter by similarity score
             if similarity < min_similarity:
                 continue
 
+            # Skip chunks of turns that are still in the conversation history
+            if live_texts:
+                chunk_text = ' '.join((original_content or '').split())
+                if any(chunk_text in text for text in live_texts):
+                    continue
+
             # --- Augment retrievals with metadata: username and timestamp ---
             # Retrieve user_name and timestamp with defaults
             speaker = metadata.get('speaker', 'UnknownUser')
@@ -207,7 +550,8 @@ class ResponseHandler:
                 result_data = {
                     'content': formatted_content, # Store the newly formatted string
                     'metadata': metadata.copy(), # Use a copy to avoid modifying original dict if needed elsewhere
-                    'score': similarity
+                    'score': similarity, # Best cosine similarity, shown to the model
+                    'relevance': candidate['fused'] # Fused across queries and recency-weighted; used for ranking
                 }
                 # Store original content temporarily within this result's metadata for future duplicate checks
                 result_data['metadata']['_original_content_for_dedup'] = original_content
@@ -222,12 +566,85 @@ class ResponseHandler:
         for res in filtered_results:
             res['metadata'].pop('_original_content_for_dedup', None)
 
-        # Sort results by score (highest similarity first) before returning
-        filtered_results.sort(key=lambda x: x['score'], reverse=True)
-
+        # Results are already in fused, recency-weighted order (most relevant first)
         # Return only the requested number of results
         return filtered_results[:max_results]
 
+    def _get_documents(self, create: bool = False, metadata: Optional[Dict] = None):
+        """
+        Return the ingested documents collection, or None if nothing was ingested
+        yet. metadata (e.g. from an export) overrides the default for a new collection.
+        """
+        if self._documents is None:
+            try:
+                if create:
+                    self._documents = self.client.get_or_create_collection(
+                        name=self.documents_collection_name,
+                        embedding_function=self.sentence_transformer_ef,
+                        metadata=metadata or self._collection_metadata()
+                    )
+                else:
+                    self._documents = self.client.get_collection(
+                        name=self.documents_collection_name,
+                        embedding_function=self.sentence_transformer_ef
+                    )
+            except Exception:
+                return None
+            self._apply_search_ef(self._documents)
+        return self._documents
+
+    def ingest_document(self, path: str) -> int:
+        """
+        Chunk a text file into the documents collection, replacing any chunks
+        previously ingested from the same path. Returns the number of chunks stored.
+        """
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        chunks = self._create_chunks(self._extract_sentences(text))
+        source = os.path.abspath(path)
+        collection = self._get_documents(create=True)
+        collection.delete(where={"source": source})
+        if not chunks:
+            return 0
+        timestamp = self._generate_timestamp()
+        collection.add(
+            documents=chunks,
+            metadatas=[{
+                "timestamp": timestamp,
+                "source": source,
+                "content_type": "document",
+                "chunk_index": i,
+                "total_chunks": len(chunks)
+            } for i in range(len(chunks))],
+            ids=[f"{source}_{i}" for i in range(len(chunks))]
+        )
+        return len(chunks)
+
+    def search_documents(self, query_text: str, max_results: int = 3, min_similarity: float = 0.2) -> List[Dict]:
+        """
+        Search ingested documents. Results are shaped like recall_memory's, with
+        content formatted as 'Document[file name]: chunk'.
+        """
+        collection = self._get_documents()
+        if collection is None or not query_text.strip():
+            return []
+        results = collection.query(query_texts=[query_text], n_results=max_results)
+        if not results or not results.get('ids') or not results['ids'][0]:
+            return []
+
+        documents = []
+        for chunk, metadata, distance in zip(results['documents'][0], results['metadatas'][0], results['distances'][0]):
+            similarity = 1.0 - distance
+            if similarity < min_similarity:
+                continue
+            source = os.path.basename((metadata or {}).get('source', 'unknown'))
+            documents.append({
+                'content': f"Document[{source}]: {chunk}",
+                'metadata': dict(metadata or {}),
+                'score': similarity
+            })
+        return documents
+
     def query_responses(self, query_text: str, n_results: int = 5) -> List[Dict]:
         """Alias for recall_memory for backward compatibility"""
         # Update the call if you change recall_memory's signature significantly
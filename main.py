@@ -9,28 +9,31 @@ https://github.com/BriannaThorez/DeeperChat
 import os
 import re
 import sys
-import json
 from typing import Iterator, Optional, List, Dict 
 
 #External packages which need to be installed via requirements
 from utilities.requirements import check_and_install_requirements#install requirements
 check_and_install_requirements()
 import requests
-import pyperclip  
 
 #Utility module scripts
 from utilities.terminal_resize import increase_terminal_buffer
 increase_terminal_buffer()
 from utilities.dynamic_importer import dynamic_import
+from utilities.module_reloader import ModuleReloader
 from utilities.setup_config import ensure_config
 from utilities.token_counter import truncate_history_by_tokens
+from utilities.session_journal import SessionJournal
+from utilities.latency_budget import CancelToken
+from utilities.memory_monitor import MemoryMonitor, history_size_bytes
 #Program-related module scripts
 from cognition_handler import ResponseHandler
+from api_router import EndpointRouter, DEFAULT_LATENCY_BUDGETS
+from code_display import StreamingCodeRenderer, RICH_AVAILABLE
 
 # Attempt to import expansive module versions with fallback to default module with source tracking
 prompt_handler, import_error, source = dynamic_import("prompt_handler")
 if prompt_handler:
-    enhance_prompt = prompt_handler.enhance_prompt
     print(f"\n[System] Using {source}/prompt_handler.py")
     if import_error:  # This would only happen if there were warnings from previous attempts
         print(f"Warning: {import_error.splitlines()[0]}")
@@ -42,120 +45,35 @@ else:
 
 #--- END IMPORTS ---
 
-# ==============================================
-# Rich Display Module for code blocks
-# ==============================================
-try:
-    from rich.syntax import Syntax
-    from rich.console import Console
-    from rich.theme import Theme
-    RICH_AVAILABLE = True
-    # Define custom theme with black background
-    # Force true black background (RGB: 0,0,0)
-    custom_theme = Theme({
-        "background": "on #000000",  # True black
-        "code": "white on #000000",
-        "keyword": "bold #56B6C2",    # Cyan
-        "string": "#98C379",          # Green
-        "number": "#D19A66",          # Orange
-        "comment": "italic #5C6370",  # Gray
-    })
-    
-    console = Console(theme=custom_theme)
-    
-    # Built-in dark themes available in Rich:
-    # "monokai", "native", "fruity", "perldoc", "tango", "rrt", "xcode"
-    SYNTAX_THEME = "monokai"  # The best dark theme option
-
-except ImportError:
-    RICH_AVAILABLE = False
-def display_code_blocks(blocks: list[dict]):
-    """Handle multiple code blocks with numbered copy options"""
-    for i, block in enumerate(blocks, 1):
-        print(f"\n{'━'*30}\nCode Block {i}/{len(blocks)}")
-                    
-        if RICH_AVAILABLE:
-            syntax = Syntax(
-                block['content'],
-                block['language'],
-                theme=SYNTAX_THEME,
-                background_color="#000000",  # Force black background
-                line_numbers=False,
-                word_wrap=True
-            )
-            console.print(syntax)
-        else:
-            print(f"```{block['language']}")
-            print(block['content'])
-            print("```")
-
-        dark_blue_bg = "\033[48;2;0;0;95m"
-        white_text = "\033[38;2;255;255;255m"
-        reset = "\033[0m"
-        print(f"{dark_blue_bg}{white_text}📋 [Press ({i}) to copy this block]{reset}")
-        print(f"{'━'*30}\n")
-        
-    print("Select a number to copy (or Enter to continue): ", end='', flush=True)
-    try:
-        choice = input()
-        if choice.isdigit() and 0 < int(choice) <= len(blocks):
-            pyperclip.copy(blocks[int(choice)-1]['content'])
-            print(f"✓ Copied Block {choice}!")
-    except Exception:
-        pass
+# Shared HTTP connection pool, kept warm across turns and module reloads
+http_session = requests.Session()
 
 # ==============================================
 # API Streaming Function
 # ==============================================
-def stream_deepseek_api(history: List[Dict[str, str]], api_key: str) -> Iterator[str]:
+def stream_deepseek_api(history: List[Dict[str, str]], api_key: str,
+                        cancel_token: Optional[CancelToken] = None) -> Iterator[str]:
     """
     Streams response from DeepSeek API using conversation history.
 
+    Requests go through the endpoint router (see api_router.EndpointRouter),
+    which picks the fastest configured endpoint and hedges stalled requests.
+
     Args:
         history: A list of message dictionaries, e.g.,
                  [{"role": "user", "content": "Hello"},
                   {"role": "assistant", "content": "Hi there!"}]
-        api_key: The DeepSeek API key.
+        api_key: The DeepSeek API key (sent only to the DeepSeek API; other endpoints use their own api_key).
+        cancel_token: Checked while streaming; when set the stream stops. Missed
+                      deadlines also cancel it, recording the reason.
 
     Yields:
         String chunks of the API response.
-    """
-    url = "https://api.deepseek.com/v1/chat/completions"
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "text/event-stream"
-    }
-
-    data = {
-        "model": "deepseek-chat",
-        "messages": history, # <-- Use the provided history
-        "stream": True,
-        "max_tokens": 8000,
-        "temperature": 0.1
-    }
-
-    try:
-        with requests.post(url, headers=headers, json=data, stream=True) as response:
-            response.raise_for_status()
 
-            for line in response.iter_lines():
-                if line:
-                    decoded_line = line.decode('utf-8')
-                    if decoded_line.startswith('data:'):
-                        json_data = decoded_line[5:].strip()
-                        if json_data != '[DONE]':
-                            try:
-                                chunk = json.loads(json_data)
-                                if 'choices' in chunk and len(chunk['choices']) > 0:
-                                    content = chunk['choices'][0].get('delta', {}).get('content', '')
-                                    if content:
-                                        yield content
-                            except json.JSONDecodeError:
-                                continue
-    except requests.exceptions.RequestException as e:
-        yield f"\nAPI request failed: {e}"
+    Closing the generator (or cancelling) closes every in-flight HTTP response,
+    so pooled connections are released instead of being left half-read.
+    """
+    yield from endpoint_router.stream(history, api_key, cancel_token)
 # ==============================================
 
 # ==============================================
@@ -174,8 +92,25 @@ def chat_loop(api_key: str, use_rich: bool = True):
     conversation_history: List[Dict[str, str]] = [
         {"role": "system", "content": system_message}
     ]
+    # --- Resume previous session(s) from the on-disk journal ---
+    restored_messages, restored_tokens = session_journal.restore(
+        max_sessions=config.get('resume_sessions', 1),
+        max_tokens=config.get('resume_max_tokens', 3000)
+    )
+    if restored_messages:
+        conversation_history.extend(restored_messages)
+        print(f"\n[System] Restored {len(restored_messages)} messages ({restored_tokens} tokens) from previous session")
+    # Highlights code while it streams; keeps the last response's blocks for /copy and /show
+    code_renderer = StreamingCodeRenderer(
+        use_rich=use_rich,
+        collapse_lines=config.get('code_collapse_lines', 120),
+        page_lines=config.get('code_page_lines', 60)
+    )
+    memory_monitor.register_gauge("chat history", lambda: history_size_bytes(conversation_history))
+    # Runs after the dedup index evictor registered at startup
+    memory_monitor.register_evictor("code render cache", code_renderer.clear_cache)
     while True:
-        print(f"\n{AppName} Type [exit] or [quit] to end chat")
+        print(f"\n{AppName} Type [exit] or [quit] to end chat, [/mem] for memory usage, [/copy N] or [/show N] for code blocks, [/ingest path] to add a document")
         # Keep the original prompt for storage/display if needed
         original_prompt = input(f"\n{user_name}: ")
 
@@ -183,11 +118,30 @@ def chat_loop(api_key: str, use_rich: bool = True):
             print("Ending chat session...")
             break
 
+        if original_prompt.strip().lower() == '/mem':
+            print(memory_monitor.report())
+            continue
+
+        if code_renderer.handle_command(original_prompt):
+            continue
+
+        if original_prompt.strip().lower().startswith('/ingest '):
+            # Add a text file to the documents searched alongside chat memory
+            path = original_prompt.strip()[len('/ingest '):].strip().strip('"')
+            try:
+                print(f"[System] Ingested {cognition_handler.ingest_document(path)} chunks from {path}")
+            except Exception as e:
+                print(f"[System] Could not ingest {path}: {e}")
+            continue
+
         if not original_prompt.strip():
             print("Please enter a valid prompt.")          
 
-        # Enhance the prompt with DB search results        
-        enhanced_prompt = enhance_prompt(original_prompt)
+        # Pick up any edits to expansive/ modules before using them
+        module_reloader.poll()
+
+        # Enhance the prompt with DB search results (recent turns help resolve follow-ups)
+        enhanced_prompt = module_reloader.call("prompt_handler", "enhance_prompt", original_prompt, conversation_history)
         # --- Add user message to Messages conversation history---
         conversation_history.append({"role": "user", "content": enhanced_prompt}) # <-- Add user prompt to history
 
@@ -208,15 +162,34 @@ def chat_loop(api_key: str, use_rich: bool = True):
         # --- Print response (streaming) ---
         print(f"\n{assistant_name}: ", end='', flush=True)
         full_response = []
+        cancel_token = CancelToken()
         # Pass messages history to the API function
-        for chunk in stream_deepseek_api(conversation_history, api_key): 
-            print(chunk, end='', flush=True)
-            full_response.append(chunk)
+        stream = stream_deepseek_api(conversation_history, api_key, cancel_token)
+        code_renderer.start_response()
+        try:
+            for chunk in stream: 
+                code_renderer.feed(chunk)
+                full_response.append(chunk)
+        except KeyboardInterrupt:
+            # Ctrl-C stops this response only, not the whole program
+            cancel_token.cancel("user interrupt")
+        finally:
+            stream.close() # Releases the HTTP connection back to the pool
+            code_renderer.finish()
         response_text = ''.join(full_response)
         # --- END Print response (streaming) ---
+        # --- Apply partial response policy if the stream was cut short ---
+        if cancel_token.cancelled:
+            print(f"\n[System] Response stopped ({cancel_token.reason})")
+            if config.get('partial_response_policy', 'keep') == 'discard':
+                response_text = ""
         # --- Add assistant response to Messages conversation history ---
         if response_text and not response_text.startswith("\nAPI request failed:"): # Avoid adding error messages as assistant responses
              conversation_history.append({"role": "assistant", "content": response_text})
+        else:
+            # Nothing usable came back - drop this turn's prompt so history stays in user/assistant pairs
+            conversation_history.pop()
+            continue
         print("\n--- Full Conversation History ---")
         for message_dict in conversation_history:
             content = message_dict.get("content", "") # Get the content, default to empty string if missing
@@ -235,36 +208,12 @@ def chat_loop(api_key: str, use_rich: bool = True):
         cognition_handler.store_response(user_name, assistant_name, latest_user_message, latest_response_message)
         # ---END Store the prompt and response in ChromaDB---
 
-        if use_rich and any('```' in line for line in full_response): # Check if response contains code blocks
-            extracted_code = extract_code_blocks(response_text) # Pass full response text
-            if extracted_code:
-                print("\n[Code Output]")
-                display_code_blocks(extracted_code)
-
+        # --- Journal the turn so it survives restarts ---
+        session_journal.append(conversation_history[-2])
+        session_journal.append(conversation_history[-1])
 
-
-
-def extract_code_blocks(text: str) -> list[dict]:
-    """Robust code block extraction that handles:
-    - Properly formatted code blocks only
-    - Nested backticks within code
-    - Language specifiers
-    - Won't match plain text between blocks
-    """
-    import re
-    # This pattern strictly matches proper code blocks only
-    pattern = r'```([a-zA-Z0-9\+]*)\n([\s\S]*?)\n```'
-    matches = re.findall(pattern, text)
-    
-    blocks = []
-    for lang, content in matches:
-        content = content.strip()
-        if content:  # Only add non-empty blocks
-            blocks.append({
-                'language': lang or 'text',
-                'content': content
-            })
-    return blocks
+        # --- Periodic memory report and RSS budget check ---
+        memory_monitor.on_turn()
 
 # ==============================================
 # Main Execution
@@ -285,6 +234,33 @@ if __name__ == "__main__":
     user_name = config['user_name']
     assistant_name = "Assistant"
     prompt = None
+    # Started before the model and vector store load so their allocations are attributed
+    memory_monitor = MemoryMonitor(
+        budget_mb=config.get('memory_budget_mb'),
+        report_every=config.get('memory_report_every', 25),
+        trace=config.get('memory_tracemalloc', False)
+    )
     cognition_handler = ResponseHandler()
+    latency_budgets = {key: config.get(key, default) for key, default in DEFAULT_LATENCY_BUDGETS.items()}
+    # Optional list of OpenAI-compatible endpoints; defaults to the DeepSeek API
+    try:
+        endpoint_router = EndpointRouter(config.get('api_endpoints'), http_session, latency_budgets)
+    except ValueError as e:
+        print(f"❌ Invalid api_endpoints in config.json: {e}")
+        exit(1)
+    session_journal = SessionJournal(
+        config.get('journal_dir', 'sessions'),
+        max_bytes=config.get('journal_max_bytes', 8 * 1024 * 1024),
+        keep_sessions=config.get('journal_keep_sessions', 20)
+    )
+    # Warm resources handed to (re)loaded modules instead of being rebuilt by them
+    module_reloader = ModuleReloader({
+        "cognition_handler": cognition_handler,
+        "http_session": http_session,
+        "session_journal": session_journal
+    })
+    module_reloader.track("prompt_handler", prompt_handler, source, required=["enhance_prompt"])
+    # Cleanup steps run in order when RSS nears memory_budget_mb (chat_loop adds its own)
+    memory_monitor.register_evictor("dedup index cache", cognition_handler.evict_caches)
     # Start chat loop with Rich disabled if not available
     chat_loop(config['deepseek_api_key'], use_rich=RICH_AVAILABLE)
\ No newline at end of file
@@ -7,62 +7,151 @@ import os
 import re
 from typing import Optional, Tuple, List, Dict
 from cognition_handler import ResponseHandler
+from utilities.retrieval_orchestrator import RetrievalOrchestrator
+
+# Words ignored when building keyword sub-queries
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'what', 'about', 'from', 'have', 'does',
+    'how', 'why', 'when', 'where', 'which', 'who', 'can', 'could', 'would', 'should', 'will',
+    'you', 'your', 'are', 'was', 'were', 'been', 'into', 'then', 'than', 'them', 'they',
+    'their', 'there', 'these', 'those', 'just', 'also', 'more', 'some', 'any', 'its', 'it\'s',
+    'please', 'tell', 'show', 'explain', 'make', 'like', 'use', 'using', 'not', 'but', 'all'
+}
+MAX_EXPANSION_QUERIES = 4
+# Relative trust in each context source when their results are ranked together
+DEFAULT_SOURCE_WEIGHTS = {
+    'local files': 1.0,      # Files the user named explicitly
+    'chat memory': 1.0,
+    'documents': 0.9,
+    'session journal': 0.6   # Keyword matches only
+}
 
 class PromptEnhancer:
-    def __init__(self):
-        self.cognition_handler = ResponseHandler()
+    def __init__(self, cognition_handler: Optional[ResponseHandler] = None, session_journal=None):
+        # Reuse the host's warm ResponseHandler (embedding model + Chroma) when given
+        self.cognition_handler = cognition_handler or ResponseHandler()
+        self.session_journal = session_journal
+        # Messages of the live history at the current turn, excluded from chat memory recall
+        self._history_texts: List[str] = []
+
+        # Every context source is queried concurrently under the recall budget
+        config = self.cognition_handler.config
+        weights = {**DEFAULT_SOURCE_WEIGHTS, **config.get('retrieval_source_weights', {})}
+        self.retriever = RetrievalOrchestrator(deadline_ms=config.get('recall_budget_ms', 150))
+        self.retriever.register_source('local files', self._search_local_files, weights['local files'])
+        self.retriever.register_source('chat memory', self._search_chat_memory, weights['chat memory'])
+        self.retriever.register_source('documents', self._search_documents, weights['documents'])
+        if session_journal is not None:
+            self.retriever.register_source('session journal', self._search_journal, weights['session journal'])
         
-    def detect_and_read_python_files(self, prompt: str) -> Tuple[str, bool]:
+    def close(self) -> None:
+        """Release the retrieval worker threads (the shared engine is left alone)."""
+        self.retriever.close()
+
+    def _search_local_files(self, prompt: str, expansions: List[str], max_results: int) -> List[Dict]:
         """
-        Detects .py files mentioned in prompt and reads their content.
-        Returns: (updated_prompt, found_files)
+        Read .py files mentioned in the prompt from the expansive directory.
+        Explicitly named files always score 1.0.
         """
         # Find all .py files mentioned in prompt
-        py_files = re.findall(r'(\w+\.py)', prompt)
+        py_files = list(dict.fromkeys(re.findall(r'(\w+\.py)', prompt)))
         if not py_files:
-            return prompt, False
+            return []
 
         # Create expansive directory if it doesn't exist
-        os.makedirs('expansive', exist_ok=True)    
-        
-       # Read found files from expansive directory only
-        file_contents = []
+        os.makedirs('expansive', exist_ok=True)
+
+        # Read found files from expansive directory only
+        results = []
         for file in py_files:
             file_path = os.path.join('expansive', file)
             if os.path.exists(file_path):
                 try:
                     with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        file_contents.append(f"Content of {file}:\n```python\n{content}\n```")
+                        content = f"Content of {file}:\n```python\n{f.read()}\n```"
                 except Exception as e:
-                    file_contents.append(f"Error reading {file}: {str(e)}")
+                    content = f"Error reading {file}: {str(e)}"
             else:
-                file_contents.append(f"File {file} not found in expansive directory")
-        
-        # Combine original prompt with file contents
-        updated_prompt = f"{prompt}\n\n[The following Python files were detected in 'expansive' directory:]\n" + "\n".join(file_contents)
-        return updated_prompt, bool(file_contents)
+                content = f"File {file} not found in expansive directory"
+            results.append({'content': content, 'metadata': {'content_type': 'file', 'file': file}, 'score': 1.0})
+        return results
 
+    def _search_chat_memory(self, prompt: str, expansions: List[str], max_results: int) -> List[Dict]:
+        return self.cognition_handler.recall_memory(prompt, max_results=max_results, expansions=expansions,
+                                                    exclude_texts=self._history_texts)
+
+    def _search_documents(self, prompt: str, expansions: List[str], max_results: int) -> List[Dict]:
+        return self.cognition_handler.search_documents(prompt, max_results=max_results)
+
+    def _search_journal(self, prompt: str, expansions: List[str], max_results: int) -> List[Dict]:
+        return self.session_journal.search(self._keywords(prompt), max_results=max_results)
+
+    @staticmethod
+    def _keywords(text: str) -> List[str]:
+        """Distinct lowercased words of text, stopwords removed, in order of appearance."""
+        keywords = []
+        for word in re.findall(r"[A-Za-z_][A-Za-z0-9_\.'-]{2,}", text):
+            lowered = word.lower()
+            if lowered not in STOPWORDS and lowered not in keywords:
+                keywords.append(lowered)
+        return keywords
+
+    def _expand_queries(self, prompt: str, history: Optional[List[Dict[str, str]]]) -> List[str]:
+        """
+        Derive extra retrieval sub-queries from the prompt and recent turns so
+        follow-ups like "what about it?" still find the topic being discussed.
+        Returns the sub-queries only (the raw prompt is searched separately).
+        """
+        if not history:
+            return []
+
+        # Most recent user/assistant turns (system message and empty entries skipped)
+        last_user = next((m['content'] for m in reversed(history) if m.get('role') == 'user' and m.get('content')), '')
+        last_assistant = next((m['content'] for m in reversed(history) if m.get('role') == 'assistant' and m.get('content')), '')
+        if not last_user and not last_assistant:
+            return []
+
+        expansions = []
+        # 1. The follow-up read in the context of the previous question
+        if last_user:
+            expansions.append(f"{last_user[-300:]} {prompt}")
+        # 2. The follow-up read against the end of the previous answer
+        if last_assistant:
+            expansions.append(f"{prompt} {last_assistant[-300:]}")
+        # 3. Salient keywords from the prompt and the previous question
+        keywords = self._keywords(f"{prompt} {last_user}")
+        if len(keywords) >= 2:
+            expansions.append(' '.join(keywords[:12]))
+
+        return expansions[:MAX_EXPANSION_QUERIES]
 
     def _format_memory_results(self, results: List[Dict]) -> str:
         """
-        Format memory search results into a readable context string,
-        handling different content types (prompt/response).
+        Format retrieval results from every source into one readable context
+        string, handling the different content types (prompt/response chunks,
+        local files, documents, earlier-session journal messages).
         """
         if not results:
             return ""
 
-        context_lines = ["\n[CONTEXT]\n[Relevant history & memory results as [User][Timestamp][ChatHistory]:"]
+        context_lines = ["\n[CONTEXT]\n[Relevant history, memory, files & documents, best match first:"]
         for i, result in enumerate(results, 1):
             # Safely get required fields with defaults
             metadata = result.get('metadata', {})
-            # Content is already formatted as 'speaker[timestamp]: text'
+            # Memory content is already formatted as 'speaker[timestamp]: text'
             formatted_content = result.get('content', '[Content Missing]')
             score = result.get('score', 0.0)
-            content_type = metadata.get('content_type', 'unknown') # Check if it's prompt or response
+            content_type = metadata.get('content_type', 'unknown') # prompt, response, file, document or journal
 
             # Add the header for the result
-            context_lines.append(f"\n=== Similarity: {score:.2f} ===")
+            if content_type == 'file':
+                context_lines.append(f"\n=== Local file: {metadata.get('file', 'unknown')} ===")
+            elif content_type == 'document':
+                context_lines.append(f"\n=== Document, similarity: {score:.2f} ===")
+            elif content_type == 'journal':
+                context_lines.append(f"\n=== Earlier session, keyword match: {score:.2f} ===")
+            else:
+                context_lines.append(f"\n=== Similarity: {score:.2f} ===")
 
             # Add the recalled content (already includes speaker and timestamp)
             context_lines.append(formatted_content)
@@ -80,31 +169,70 @@ class PromptEnhancer:
         context_str = "\n".join(context_lines)
         return context_str
 
-    def enhance_prompt(self, prompt: str) -> str:
+    def enhance_prompt(self, prompt: str, history: Optional[List[Dict[str, str]]] = None) -> str:
         """
         Enhanced version that:
-        1. Checks for Python files
-        2. Searches for relevant past conversations
+        1. Queries every context source (local files, chat memory, documents,
+           session journal) concurrently under the recall budget
+        2. Ranks their results together (memory queries expanded with recent turns)
         3. Combines everything into final prompt
         """
-        # First check for Python files
-        enhanced_prompt, files_found = self.detect_and_read_python_files(prompt)
-        
-        if files_found:
-            print("\n[System] Detected and included Python file(s) from expansive directory")
-        
-        # Search for relevant past conversations
-        memory_results = self.cognition_handler.recall_memory(prompt, max_results=3)
-        memory_context = self._format_memory_results(memory_results)
+        expansions = self._expand_queries(prompt, history)
+        # Turns still in the history (e.g. the answer just stored) are already in the model's context
+        self._history_texts = [m['content'] for m in history or []
+                               if m.get('role') in ('user', 'assistant') and m.get('content')]
+        results, missed = self.retriever.retrieve(
+            prompt, expansions,
+            max_results=self.cognition_handler.config.get('retrieval_max_results', 5)
+        )
+        if missed:
+            # Degrade gracefully: answer without the slow sources rather than stall the turn
+            print(f"\n[System] {', '.join(missed)} exceeded the {self.retriever.deadline_ms} ms retrieval budget - continuing without")
+        memory_context = self._format_memory_results(results)
+
+        if results:
+            counts = {}
+            for result in results:
+                counts[result['source']] = counts.get(result['source'], 0) + 1
+            print(f"\n[System] Found {len(results)} relevant results ("
+                  + ", ".join(f"{name}: {count}" for name, count in counts.items()) + ")")
 
-        if memory_results:
-            print(f"\n[System] Found {len(memory_results)} relevant past conversations")
-            
         # Combine everything
-        final_prompt = f"If applicable, use the following to assist in answering the user instruction:{memory_context} \n[INSTRUCTION]:\n {enhanced_prompt}"
+        final_prompt = f"If applicable, use the following to assist in answering the user instruction:{memory_context} \n[INSTRUCTION]:\n {prompt}"
         #print(f"\033[32m{final_prompt}\033[0m")
         return final_prompt
 
+# --- Module-level interface used by main.py and the module reloader ---
+_engine: Dict = {}
+_enhancer: Optional[PromptEnhancer] = None
+
+def attach_engine(engine: Dict) -> None:
+    """
+    Adopt warm shared resources from the host process, e.g.
+    {'cognition_handler': ResponseHandler, 'http_session': requests.Session,
+     'session_journal': SessionJournal}.
+    Called on startup and whenever this module is hot-reloaded.
+    """
+    global _engine
+    close()
+    _engine = engine
+
+def close() -> None:
+    """Release this version's enhancer; called by the module reloader when it is replaced."""
+    global _enhancer
+    if _enhancer is not None:
+        _enhancer.close()
+        _enhancer = None
+
+def smoke_check() -> None:
+    """Cheap sanity check run by the module reloader before swapping this module in."""
+    sample = [{'content': 'User[2025-01-01T00:00:00]: hello', 'metadata': {'content_type': 'prompt'}, 'score': 0.5}]
+    if 'hello' not in PromptEnhancer._format_memory_results(None, sample):
+        raise RuntimeError("_format_memory_results produced unexpected output")
+
 # For backward compatibility
-def enhance_prompt(prompt: str) -> str:
-    return PromptEnhancer().enhance_prompt(prompt)
\ No newline at end of file
+def enhance_prompt(prompt: str, history: Optional[List[Dict[str, str]]] = None) -> str:
+    global _enhancer
+    if _enhancer is None:
+        _enhancer = PromptEnhancer(_engine.get('cognition_handler'), _engine.get('session_journal'))
+    return _enhancer.enhance_prompt(prompt, history)
\ No newline at end of file
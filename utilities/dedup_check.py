@@ -0,0 +1,91 @@
+# utilities/dedup_check.py
+"""
+Timing check for the write-time dedup index at a realistic store size.
+
+Fills a throwaway DedupIndex with synthetic chunks (sized like the stores
+utilities.memory_transfer imports), then times find() for new, exact-repeat
+and lightly edited chunks - the calls store_response makes for every chunk of
+every turn.
+
+Usage:
+    python -m utilities.dedup_check [--size 200000] [--lookups 300] [--budget-ms 5]
+Exits with status 1 if the p95 lookup time exceeds the budget or an exact
+repeat is missed.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from utilities.dedup_index import DedupIndex
+
+VOCABULARY_SIZE = 5000
+CHUNK_WORDS = (20, 60)   # Three-sentence chunks, roughly
+ADD_BATCH = 10000
+SCOPE = "response:Assistant"
+
+
+def _chunk(rng: random.Random, vocabulary: list) -> str:
+    return ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(*CHUNK_WORDS)))
+
+def _edit(rng: random.Random, text: str) -> str:
+    """Replace one word, like a reworded repeat of an earlier answer."""
+    words = text.split()
+    words[rng.randrange(len(words))] = "changed"
+    return ' '.join(words)
+
+
+def run_check(size: int, lookups: int, budget_ms: float) -> bool:
+    rng = random.Random(0)
+    vocabulary = [f"w{i}" for i in range(VOCABULARY_SIZE)]
+    workdir = tempfile.mkdtemp(prefix="dedup_check_")
+    try:
+        index = DedupIndex(os.path.join(workdir, "dedup_index.sqlite3"))
+        stored = []
+        started = time.perf_counter()
+        for start in range(0, size, ADD_BATCH):
+            batch = [_chunk(rng, vocabulary) for _ in range(min(ADD_BATCH, size - start))]
+            index.add_many((text, SCOPE, "chat_responses_2025_01", str(start + i)) for i, text in enumerate(batch))
+            stored.extend(rng.sample(batch, min(len(batch), lookups)))
+        print(f"[Dedup Check] Indexed {len(index):,} chunks in {time.perf_counter() - started:.1f}s")
+
+        passed = True
+        samples = rng.sample(stored, min(lookups, len(stored)))
+        cases = {
+            "new chunk": [_chunk(rng, vocabulary) for _ in samples],
+            "exact repeat": samples,
+            "one-word edit": [_edit(rng, text) for text in samples]
+        }
+        for name, texts in cases.items():
+            latencies = []
+            found = 0
+            for text in texts:
+                started = time.perf_counter()
+                found += index.find(text, SCOPE) is not None
+                latencies.append((time.perf_counter() - started) * 1000)
+            p50, p95 = np.percentile(latencies, 50), np.percentile(latencies, 95)
+            print(f"[Dedup Check] {name:<14} p50 {p50:.2f} ms  p95 {p95:.2f} ms  matched {found}/{len(texts)}")
+            if p95 > budget_ms:
+                passed = False
+                print(f"[Dedup Check] FAIL: {name} p95 above the {budget_ms} ms budget")
+            if name == "exact repeat" and found != len(texts):
+                passed = False
+                print("[Dedup Check] FAIL: exact repeats were missed")
+        print(f"[Dedup Check] {'PASS' if passed else 'FAIL'}")
+        return passed
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time dedup index lookups at a realistic store size")
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=300)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    sys.exit(0 if run_check(args.size, args.lookups, args.budget_ms) else 1)
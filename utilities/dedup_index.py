@@ -0,0 +1,139 @@
+# utilities/dedup_index.py
+import re
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Tuple, Iterable
+
+import numpy as np
+
+# --- Near-duplicate detection settings ---
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4          # 4 x 16-bit bands: a band value matches ~1/65536 of rows, so lookups stay
+                           # cheap at scale. Pairs within 3 bits always share a band; within 6, usually
+MAX_HAMMING_DISTANCE = 6   # Candidates sharing a band this close are treated as the same chunk
+MIN_WORDS_FOR_NEAR_DUP = 8 # Shorter chunks only dedup on exact content
+SHINGLE_SIZE = 3
+SCHEMA_VERSION = 2         # Bump when the banding changes; older indexes are dropped and rebuilt
+
+
+def _normalise(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial reformatting hashes the same."""
+    return ' '.join(text.lower().split())
+
+def content_hash(text: str, scope: str = "") -> str:
+    """Exact-match key for a chunk. Scope keeps e.g. user and assistant text apart."""
+    return hashlib.sha1(f"{scope}\x00{_normalise(text)}".encode('utf-8')).hexdigest()
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word shingles (bit counting vectorised with numpy)."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) >= SHINGLE_SIZE:
+        features = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    else:
+        features = words
+    if not features:
+        return 0
+    digests = b''.join(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest() for f in features)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(len(features), SIMHASH_BITS)
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority).tobytes(), 'big')
+
+def _bands(signature: int) -> Tuple[int, ...]:
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    return tuple((signature >> (i * width)) & mask for i in range(SIMHASH_BANDS))
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class DedupIndex:
+    """
+    Write-time deduplication index for memory chunks, stored in SQLite.
+
+    Maps an exact content hash and a banded SimHash signature to the chunk
+    already holding that content (shard + document ID), so repeated text can
+    be linked to the existing vector instead of being embedded again.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Band values from another layout never match - start empty so the store re-indexes
+            self._conn.execute("DROP TABLE IF EXISTS chunks")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                hash TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                shard TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                simhash INTEGER,
+                """ + ", ".join(f"b{i} INTEGER" for i in range(SIMHASH_BANDS)) + """
+            )""")
+        for band in range(SIMHASH_BANDS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_band{band} ON chunks (scope, b{band})")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def find(self, text: str, scope: str = "") -> Optional[Tuple[str, str]]:
+        """
+        Return (shard, doc_id) of an existing chunk with the same or nearly the
+        same content in this scope, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT shard, doc_id FROM chunks WHERE hash = ?", (content_hash(text, scope),)
+            ).fetchone()
+            if row or len(text.split()) < MIN_WORDS_FOR_NEAR_DUP:
+                return tuple(row) if row else None
+
+            signature = simhash(text)
+            bands = _bands(signature)
+            # One indexed (scope, band) lookup per band - SQLite will not use the band
+            # indexes for "scope = ? AND (b0 = ? OR b1 = ? ...)" and scans the whole scope
+            rows = self._conn.execute(
+                " UNION ".join(
+                    f"SELECT shard, doc_id, simhash FROM chunks WHERE scope = ? AND b{i} = ?"
+                    for i in range(SIMHASH_BANDS)
+                ),
+                tuple(value for band in bands for value in (scope, band))
+            ).fetchall()
+        for shard, doc_id, other in rows:
+            if other is not None and bin((other & ((1 << 64) - 1)) ^ signature).count('1') <= MAX_HAMMING_DISTANCE:
+                return shard, doc_id
+        return None
+
+    def add_many(self, entries: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Register chunks as (text, scope, shard, doc_id)."""
+        rows = []
+        for text, scope, shard, doc_id in entries:
+            signature = simhash(text) if len(text.split()) >= MIN_WORDS_FOR_NEAR_DUP else None
+            bands = _bands(signature) if signature is not None else (None,) * SIMHASH_BANDS
+            rows.append((content_hash(text, scope), scope, shard, doc_id,
+                         _to_signed(signature) if signature is not None else None, *bands))
+        with self._lock:
+            band_columns = ", ".join(f"b{i}" for i in range(SIMHASH_BANDS))
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO chunks (hash, scope, shard, doc_id, simhash, {band_columns}) "
+                f"VALUES ({', '.join('?' * (5 + SIMHASH_BANDS))})", rows
+            )
+            self._conn.commit()
+
+    def remove(self, shard: str, doc_id: str) -> None:
+        """Forget a chunk that no longer exists in the store."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE shard = ? AND doc_id = ?", (shard, doc_id))
+            self._conn.commit()
+
+    def shrink_memory(self) -> None:
+        """Release SQLite page cache memory held by this connection."""
+        with self._lock:
+            self._conn.execute("PRAGMA shrink_memory")
@@ -1,10 +1,31 @@
 import os
 import importlib
+import importlib.util
 import sys
 import traceback
 from typing import Optional, Tuple
 
-def dynamic_import(module_name: str) -> Tuple[Optional[object], Optional[str]]:
+def load_module_from_path(module_name: str, path: str) -> object:
+    """
+    Executes the file at path as a fresh module registered under module_name.
+    If execution fails the previous sys.modules entry (if any) is restored
+    and the exception is re-raised.
+    """
+    previous = sys.modules.get(module_name)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        if previous is not None:
+            sys.modules[module_name] = previous
+        else:
+            sys.modules.pop(module_name, None)
+        raise
+    return module
+
+def dynamic_import(module_name: str) -> Tuple[Optional[object], Optional[str], Optional[str]]:
     """
     Attempts to import from expansive directory first,
     falls back to main directory if needed.
@@ -19,13 +40,7 @@ def dynamic_import(module_name: str) -> Tuple[Optional[object], Optional[str]]:
     # Try expansive version first
     if os.path.exists(expansive_path):
         try:
-            spec = importlib.util.spec_from_file_location(
-                f"expansive.{module_name}", 
-                expansive_path
-            )
-            module = importlib.util.module_from_spec(spec)
-            sys.modules[f"expansive.{module_name}"] = module
-            spec.loader.exec_module(module)
+            module = load_module_from_path(f"expansive.{module_name}", expansive_path)
             return module, None, 'expansive'
         except Exception as e:
             error = f"Expansive version failed:\n{traceback.format_exc()}"
@@ -0,0 +1,221 @@
+# utilities/hnsw_benchmark.py
+"""
+HNSW parameter sweep for the chat memory collections.
+
+Builds Chroma collections over a synthetic corpus (or a memory export from
+utilities.memory_transfer) at several sizes, sweeps M / construction_ef /
+search_ef, and measures recall@k against exact brute-force search, query
+latency percentiles, build time and on-disk index size. Writes report.json and
+report.md and recommends the `hnsw_params` to put in config.json.
+
+Usage:
+    python -m utilities.hnsw_benchmark [--corpus EXPORT_DIR] [--sizes 2000,10000]
+        [--m 8,16,32] [--construction-ef 100,200] [--search-ef 10,50,100]
+        [--k 10] [--queries 200] [--target-recall 0.95] [--out hnsw_report]
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from itertools import product
+from typing import Dict, List, Optional
+
+import numpy as np
+import chromadb
+
+from utilities.memory_transfer import MANIFEST_FILENAME
+
+EMBEDDING_DIM = 384      # all-MiniLM-L6-v2
+ADD_BATCH = 5000
+
+
+# --- Corpus ---
+def synthetic_corpus(size: int, dim: int = EMBEDDING_DIM, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around random topic centres, roughly like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    vectors = centres[rng.integers(0, clusters, size)] + rng.normal(scale=0.6, size=(size, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def exported_corpus(export_dir: str) -> np.ndarray:
+    """All embeddings from a memory export, normalised for cosine search."""
+    with open(os.path.join(export_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    parts = []
+    for part in manifest["parts"]:
+        with np.load(os.path.join(export_dir, part["file"])) as data:
+            parts.append(data["embeddings"])
+    vectors = np.vstack(parts).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_queries(corpus: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus vectors, so each query has close but not identical neighbours."""
+    rng = np.random.default_rng(seed)
+    queries = corpus[rng.integers(0, len(corpus), count)] + rng.normal(scale=0.05, size=(count, corpus.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground-truth top-k indices by brute-force cosine similarity."""
+    similarities = queries @ corpus.T
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(similarities, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+# --- Measurement ---
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run_config(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+               m: int, construction_ef: int, search_ef: int) -> Dict:
+    """Build one collection with the given HNSW parameters and measure it."""
+    workdir = tempfile.mkdtemp(prefix="hnsw_bench_")
+    client = None
+    try:
+        client = chromadb.PersistentClient(path=workdir)
+        collection = client.create_collection(
+            name="bench",
+            metadata={
+                "hnsw:space": "cosine",
+                "hnsw:M": m,
+                "hnsw:construction_ef": construction_ef,
+                "hnsw:search_ef": search_ef
+            }
+        )
+        ids = [str(i) for i in range(len(corpus))]
+
+        started = time.perf_counter()
+        for start in range(0, len(corpus), ADD_BATCH):
+            collection.add(ids=ids[start:start + ADD_BATCH], embeddings=corpus[start:start + ADD_BATCH])
+        build_s = time.perf_counter() - started
+
+        # Single-query calls, matching how recall_memory queries a shard per turn
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = collection.query(query_embeddings=[query], n_results=k, include=[])
+            latencies.append((time.perf_counter() - started) * 1000)
+            found = {int(doc_id) for doc_id in result["ids"][0]}
+            hits += len(found.intersection(expected.tolist()))
+
+        # Chroma caches every client's System process-wide; release this one so earlier
+        # configurations do not stay resident and skew later latencies, and so the
+        # index size below is measured after everything was flushed and closed
+        client.clear_system_cache()
+        client = None
+
+        latencies = np.array(latencies)
+        return {
+            "size": len(corpus),
+            "M": m,
+            "construction_ef": construction_ef,
+            "search_ef": search_ef,
+            "recall_at_k": hits / (len(queries) * k),
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p95_ms": float(np.percentile(latencies, 95)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+            "build_s": build_s,
+            "index_bytes": _dir_size(workdir)
+        }
+    finally:
+        if client is not None:
+            client.clear_system_cache()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def recommend(results: List[Dict], target_recall: float) -> Optional[Dict]:
+    """Fastest (p95) configuration meeting target_recall at the largest size tested, else the most accurate."""
+    largest = max(r["size"] for r in results)
+    candidates = [r for r in results if r["size"] == largest]
+    passing = [r for r in candidates if r["recall_at_k"] >= target_recall]
+    if passing:
+        return min(passing, key=lambda r: (r["latency_p95_ms"], r["index_bytes"]))
+    return max(candidates, key=lambda r: r["recall_at_k"]) if candidates else None
+
+
+# --- Reporting ---
+def write_report(out_dir: str, results: List[Dict], best: Optional[Dict], settings: Dict) -> None:
+    os.makedirs(out_dir, exist_ok=True)
+    recommended = {"M": best["M"], "construction_ef": best["construction_ef"], "search_ef": best["search_ef"]} if best else None
+    with open(os.path.join(out_dir, "report.json"), 'w', encoding='utf-8') as f:
+        json.dump({"settings": settings, "results": results, "recommended_hnsw_params": recommended}, f, indent=2)
+
+    lines = [
+        f"# HNSW sweep ({settings['generated_at']})",
+        "",
+        f"Corpus: {settings['corpus']}, k={settings['k']}, {settings['queries']} queries, "
+        f"target recall@k {settings['target_recall']}",
+        "",
+        "| size | M | construction_ef | search_ef | recall@k | p50 ms | p95 ms | p99 ms | build s | index MB |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|"
+    ]
+    for r in results:
+        lines.append(
+            f"| {r['size']} | {r['M']} | {r['construction_ef']} | {r['search_ef']} | {r['recall_at_k']:.3f} "
+            f"| {r['latency_p50_ms']:.2f} | {r['latency_p95_ms']:.2f} | {r['latency_p99_ms']:.2f} "
+            f"| {r['build_s']:.1f} | {r['index_bytes'] / 1e6:.1f} |"
+        )
+    lines.append("")
+    if recommended:
+        lines.append("Recommended config.json entry:")
+        lines.append("")
+        lines.append(f"    \"hnsw_params\": {json.dumps(recommended)}")
+    with open(os.path.join(out_dir, "report.md"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep HNSW parameters for the chat memory collections")
+    parser.add_argument("--corpus", help="Memory export directory (default: synthetic corpus)")
+    parser.add_argument("--sizes", type=_int_list, default=[2000, 10000])
+    parser.add_argument("--m", type=_int_list, default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=_int_list, default=[100, 200])
+    parser.add_argument("--search-ef", type=_int_list, default=[10, 50, 100])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--out", default="hnsw_report")
+    args = parser.parse_args()
+
+    full_corpus = exported_corpus(args.corpus) if args.corpus else synthetic_corpus(max(args.sizes))
+    results = []
+    for size in args.sizes:
+        if size > len(full_corpus):
+            print(f"[HNSW Bench] Skipping size {size}: corpus only has {len(full_corpus)} vectors")
+            continue
+        corpus = full_corpus[:size]
+        queries = make_queries(corpus, args.queries)
+        truth = exact_neighbours(corpus, queries, args.k)
+        for m, construction_ef, search_ef in product(args.m, args.construction_ef, args.search_ef):
+            result = run_config(corpus, queries, truth, args.k, m, construction_ef, search_ef)
+            results.append(result)
+            print(f"[HNSW Bench] size={size} M={m} construction_ef={construction_ef} search_ef={search_ef}: "
+                  f"recall@{args.k}={result['recall_at_k']:.3f} p95={result['latency_p95_ms']:.2f}ms "
+                  f"build={result['build_s']:.1f}s")
+
+    if not results:
+        print("[HNSW Bench] Nothing measured")
+        return
+    best = recommend(results, args.target_recall)
+    settings = {
+        "generated_at": datetime.now().isoformat(),
+        "corpus": args.corpus or "synthetic",
+        "k": args.k,
+        "queries": args.queries,
+        "target_recall": args.target_recall
+    }
+    write_report(args.out, results, best, settings)
+    print(f"[HNSW Bench] Report written to {args.out}/report.md")
+    if best:
+        print(f"[HNSW Bench] Recommended: M={best['M']} construction_ef={best['construction_ef']} "
+              f"search_ef={best['search_ef']} (recall@{args.k}={best['recall_at_k']:.3f})")
+
+
+if __name__ == "__main__":
+    main()
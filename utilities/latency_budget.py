@@ -0,0 +1,24 @@
+# utilities/latency_budget.py
+import threading
+from typing import Optional
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag shared between the chat loop and a running stage.
+    The stage checks `cancelled` at safe points and stops on its own, recording
+    why through `reason` (e.g. "user interrupt", "first-token deadline").
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
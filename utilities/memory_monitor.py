@@ -0,0 +1,181 @@
+# utilities/memory_monitor.py
+import os
+import gc
+import sys
+import ctypes
+import platform
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Path fragments used to attribute Python allocations to a subsystem, checked in order
+SUBSYSTEM_PATTERNS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("embedding model", ("sentence_transformers", "transformers", "torch", "tokenizers", "huggingface_hub")),
+    ("vector store", ("chromadb", "hnswlib", "onnxruntime", "sqlite3")),
+    ("tokenizer", ("tiktoken",)),
+    ("nltk", ("nltk",)),
+    ("http", ("requests", "urllib3", "http", "ssl", "socket")),
+    ("display", ("rich", "pygments")),
+]
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_FRAMES = 25
+RERUN_GROWTH = 0.05  # Fraction of the budget RSS must grow before a failed eviction pass is retried
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (0 if it cannot be determined)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil  # Optional: used on platforms without /proc
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Peak, not current - best available
+        return peak if platform.system() == "Darwin" else peak * 1024
+    except Exception:
+        return 0
+
+def release_freed_memory() -> None:
+    """Run a full GC and ask glibc to hand freed heap pages back to the OS."""
+    gc.collect()
+    if platform.system() == "Linux":
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+def _subsystem_for(filename: str) -> Optional[str]:
+    for name, fragments in SUBSYSTEM_PATTERNS:
+        for fragment in fragments:
+            if f"{os.sep}{fragment}{os.sep}" in filename or filename.endswith(f"{os.sep}{fragment}.py"):
+                return name
+    if filename.startswith(APP_ROOT) and "site-packages" not in filename:
+        return "app"
+    return None
+
+def _mb(num_bytes: float) -> str:
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+class MemoryMonitor:
+    """
+    Per-subsystem memory accounting with an RSS budget.
+
+    Reports RSS, tracemalloc-attributed Python allocations by subsystem and any
+    registered gauges (e.g. conversation history size). When RSS crosses
+    high_water * budget, registered evictors run in order until usage drops
+    back under the mark, so the budget is defended before it is exceeded. A
+    pass that cannot get under the mark is only retried once RSS has grown by
+    another RERUN_GROWTH of the budget.
+    """
+
+    def __init__(self, budget_mb: Optional[float] = None, high_water: float = 0.9,
+                 report_every: int = 0, trace: bool = False):
+        self.budget_bytes = budget_mb * 1024 * 1024 if budget_mb else None
+        self.high_water = high_water
+        self.report_every = report_every
+        self.turns = 0
+        # RSS after the last full eviction pass if it left usage above the mark
+        self._failed_pass_rss: Optional[int] = None
+        self._gauges: Dict[str, Callable[[], int]] = {}
+        self._evictors: List[Tuple[str, Callable[[], None]]] = []
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def register_gauge(self, name: str, measure: Callable[[], int]) -> None:
+        """Report an application-level size estimate (bytes) alongside the subsystems."""
+        self._gauges[name] = measure
+
+    def register_evictor(self, name: str, evict: Callable[[], None]) -> None:
+        """Add a cleanup step run (in registration order) when RSS nears the budget."""
+        self._evictors.append((name, evict))
+
+    # --- Measurement ---
+    def subsystem_usage(self) -> Dict[str, int]:
+        """Traced Python allocations grouped by subsystem (empty if tracing is off)."""
+        if not tracemalloc.is_tracing():
+            return {}
+        usage: Dict[str, int] = {}
+        for stat in tracemalloc.take_snapshot().statistics("traceback"):
+            owner = "other"
+            # Innermost frames are often stdlib helpers - attribute to the first known caller
+            for frame in reversed(stat.traceback):
+                subsystem = _subsystem_for(frame.filename)
+                if subsystem:
+                    owner = subsystem
+                    break
+            usage[owner] = usage.get(owner, 0) + stat.size
+        return usage
+
+    def report(self) -> str:
+        """Multi-line memory report for the /mem command."""
+        rss = current_rss_bytes()
+        lines = [f"[Memory] RSS {_mb(rss)}" + (f" of {_mb(self.budget_bytes)} budget" if self.budget_bytes else "")]
+        usage = self.subsystem_usage()
+        if usage:
+            traced = sum(usage.values())
+            for name, size in sorted(usage.items(), key=lambda item: item[1], reverse=True):
+                lines.append(f"  {name:<16} {_mb(size):>10}")
+            # Model weights, HNSW graphs etc. live in native allocations tracemalloc cannot see
+            lines.append(f"  {'native/untraced':<16} {_mb(max(rss - traced, 0)):>10}")
+        else:
+            lines.append("  (set memory_tracemalloc: true in config.json for per-subsystem attribution)")
+        for name, measure in self._gauges.items():
+            try:
+                lines.append(f"  {name:<16} {_mb(measure()):>10} (estimate)")
+            except Exception as e:
+                lines.append(f"  {name:<16} unavailable ({e})")
+        return "\n".join(lines)
+
+    # --- Budget enforcement ---
+    def enforce_budget(self) -> bool:
+        """
+        Run evictors while RSS is above the high-water mark.
+        Returns True if usage ended below the mark (or no budget is set).
+        """
+        if not self.budget_bytes:
+            return True
+        limit = self.budget_bytes * self.high_water
+        rss = current_rss_bytes()
+        if rss <= limit:
+            self._failed_pass_rss = None
+            return True
+        # A pass that could not get under the mark is not repeated every turn; only
+        # once usage has grown again (e.g. a budget set below the model's baseline)
+        if self._failed_pass_rss is not None and rss < self._failed_pass_rss + self.budget_bytes * RERUN_GROWTH:
+            return False
+        print(f"\n[Memory] RSS {_mb(rss)} above {int(self.high_water * 100)}% of budget - reclaiming")
+        for name, evict in self._evictors:
+            try:
+                evict()
+            except Exception as e:
+                print(f"[Memory] Evictor '{name}' failed: {e}")
+            release_freed_memory()
+            rss = current_rss_bytes()
+            print(f"[Memory]   after {name}: {_mb(rss)}")
+            if rss <= limit:
+                self._failed_pass_rss = None
+                return True
+        print(f"[Memory] Warning: still at {_mb(rss)} after all evictions")
+        self._failed_pass_rss = rss
+        return False
+
+    def on_turn(self) -> None:
+        """Call once per chat turn: periodic one-line report plus budget check."""
+        self.turns += 1
+        if self.report_every and self.turns % self.report_every == 0:
+            print(f"\n[Memory] Turn {self.turns}: RSS {_mb(current_rss_bytes())}")
+        self.enforce_budget()
+
+
+def history_size_bytes(history: List[Dict[str, str]]) -> int:
+    """Approximate memory held by a conversation history list."""
+    return sys.getsizeof(history) + sum(
+        sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+        for message in history
+    )
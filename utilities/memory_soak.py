@@ -0,0 +1,138 @@
+# utilities/memory_soak.py
+"""
+Memory soak test: thousands of simulated chat turns against the local stand-in
+server, asserting that RSS stays flat once warmed up.
+
+Each turn mirrors chat_loop: enhance the prompt from every retrieval source,
+append it, truncate history by tokens, stream a reply through the endpoint
+router into the code renderer, store the turn in a throwaway vector store
+(loads the embedding model), journal it and run the memory monitor with the
+same budget settings and evictors as main.py. The journal is reopened
+periodically to simulate restarts. --router-only skips the vector store and
+prompt enhancement for a quick check of the streaming path.
+
+Usage:
+    python -m utilities.memory_soak [--turns 3000] [--warmup 1000] [--tolerance-mb MB] [--router-only]
+Exits with status 1 if RSS grew by more than the tolerance after warmup.
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+import requests
+
+from api_router import EndpointRouter
+from utilities.standin_server import start_standin_server
+from utilities.session_journal import SessionJournal
+from utilities.token_counter import truncate_history_by_tokens
+from utilities.memory_monitor import MemoryMonitor, current_rss_bytes, release_freed_memory
+from code_display import StreamingCodeRenderer
+
+SOAK_REPLY = " ".join(
+    f"Sentence {i} of the stand-in answer explains a detail about the question." for i in range(20)
+) + "\n```python\nprint('stand-in')\n```\nDone."
+RESTART_EVERY = 200  # Turns between simulated restarts (journal reopen + restore)
+SOAK_BUDGET_MB = 1024  # memory_budget_mb for the soak, so the store runs with its LRU segment cache
+# Chroma's native query/update path keeps creeping a few KB per turn (not reachable
+# from Python or malloc_trim); a leaked history copy per turn would be ~10x this
+FULL_TOLERANCE_MB = 12.0
+ROUTER_TOLERANCE_MB = 8.0
+
+
+def run_soak(turns: int, warmup: int, tolerance_mb: float, with_memory: bool = True) -> bool:
+    workdir = tempfile.mkdtemp(prefix="deeperchat_soak_")
+    previous_cwd = os.getcwd()
+    server, url = start_standin_server(first_token_delay_s=0.0, reply=SOAK_REPLY)
+    try:
+        os.chdir(workdir)
+        memory = None
+        enhancer = None
+        journal = SessionJournal("sessions", max_bytes=512 * 1024, keep_sessions=5)
+        if with_memory:
+            # A private config and store so the soak never touches the user's memory
+            with open("config.json", "w") as f:
+                json.dump({"deepseek_api_key": "sk-soak" + "0" * 32, "user_name": "SoakUser",
+                           "memory_budget_mb": SOAK_BUDGET_MB}, f)
+            from cognition_handler import ResponseHandler
+            from prompt_handler import PromptEnhancer
+            memory = ResponseHandler()
+            enhancer = PromptEnhancer(memory, journal)
+
+        router = EndpointRouter([{"name": "standin", "url": url}], requests.Session())
+        renderer = StreamingCodeRenderer()
+        history = [{"role": "system", "content": "You are a helpful assistant."}]
+        monitor = MemoryMonitor(budget_mb=SOAK_BUDGET_MB)
+        # Same evictors, in the same order, as main.py and chat_loop
+        if memory:
+            monitor.register_evictor("dedup index cache", memory.evict_caches)
+        monitor.register_evictor("code render cache", renderer.clear_cache)
+        baseline = None
+        samples = []
+        for turn in range(1, turns + 1):
+            prompt = f"Question {turn}: how does part {turn % 97} of the system behave under load?"
+            # Silence the per-turn debug output the real loop prints
+            with contextlib.redirect_stdout(io.StringIO()):
+                enhanced = enhancer.enhance_prompt(prompt, history) if enhancer else prompt
+                history.append({"role": "user", "content": enhanced})
+                history, _ = truncate_history_by_tokens(history, max_tokens=5000)
+                renderer.start_response()
+                chunks = []
+                for chunk in router.stream(history, "sk-soak"):
+                    renderer.feed(chunk)
+                    chunks.append(chunk)
+                renderer.finish()
+                reply = "".join(chunks)
+                history.append({"role": "assistant", "content": reply})
+                history[-2]["content"] = prompt  # Stored and journalled without retrieved context
+                journal.append(history[-2])
+                journal.append(history[-1])
+                if memory:
+                    memory.store_response("SoakUser", "Assistant", prompt, reply)
+                monitor.on_turn()
+                if turn % RESTART_EVERY == 0:
+                    journal = SessionJournal("sessions", max_bytes=512 * 1024, keep_sessions=5)
+                    journal.restore(max_sessions=1, max_tokens=3000)
+                    if enhancer:
+                        enhancer = PromptEnhancer(memory, journal)
+
+            if turn == warmup:
+                release_freed_memory()
+                baseline = current_rss_bytes()
+            if turn % max(turns // 10, 1) == 0:
+                release_freed_memory()
+                samples.append((turn, current_rss_bytes()))
+                print(f"[Soak] turn {turn:>6}: RSS {samples[-1][1] / 1e6:.1f} MB")
+
+        release_freed_memory()
+        final = current_rss_bytes()
+        baseline = baseline or samples[0][1]
+        growth_mb = (final - baseline) / 1e6
+        passed = growth_mb <= tolerance_mb
+        print(f"[Soak] {turns} turns, RSS after warmup {baseline / 1e6:.1f} MB -> {final / 1e6:.1f} MB "
+              f"({growth_mb:+.1f} MB, tolerance {tolerance_mb} MB): {'PASS' if passed else 'FAIL'}")
+        print(f"[Soak] Stand-in requests served: {server.request_count}")
+        return passed
+    finally:
+        server.shutdown()
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated-turn memory soak test")
+    parser.add_argument("--turns", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=1000,
+                        help="Turns before the baseline; the vector store's native caches fill over the first ~1000")
+    parser.add_argument("--tolerance-mb", type=float, default=None,
+                        help=f"Allowed RSS growth after warmup (default {FULL_TOLERANCE_MB}, "
+                             f"{ROUTER_TOLERANCE_MB} with --router-only)")
+    parser.add_argument("--router-only", action="store_true",
+                        help="Skip the vector store and prompt enhancement (no embedding model needed)")
+    args = parser.parse_args()
+    tolerance_mb = args.tolerance_mb or (ROUTER_TOLERANCE_MB if args.router_only else FULL_TOLERANCE_MB)
+    sys.exit(0 if run_soak(args.turns, args.warmup, tolerance_mb, not args.router_only) else 1)
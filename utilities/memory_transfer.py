@@ -0,0 +1,204 @@
+# utilities/memory_transfer.py
+"""
+Bulk export/import of the memory store with precomputed embeddings.
+
+An export is a directory of .npz parts plus a manifest.json. Each part holds
+one columnar slice of a memory shard or of the ingested documents collection: float32 embeddings plus ids, documents and
+JSON-encoded metadata packed as UTF-8 blobs with offset arrays. Importing
+adds the stored vectors directly, so nothing is re-embedded.
+
+Usage:
+    python -m utilities.memory_transfer export <directory>
+    python -m utilities.memory_transfer import <directory>
+"""
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+MANIFEST_FILENAME = "manifest.json"
+EXPORT_FORMAT = "deeperchat-memory"
+EXPORT_VERSION = 1
+DEFAULT_PART_SIZE = 50000   # Chunks per .npz part
+DEFAULT_READ_PAGE = 5000    # Chunks fetched from Chroma per get() call
+DEFAULT_IMPORT_BATCH = 5000 # Chunks per upsert() call
+
+
+# --- Columnar string packing ---
+def _pack_strings(values: List[str]) -> Dict[str, np.ndarray]:
+    """Pack strings into one UTF-8 blob plus an offsets array (len(values) + 1)."""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], dtype=np.int64, out=offsets[1:])
+    return {"blob": np.frombuffer(b''.join(encoded), dtype=np.uint8), "offsets": offsets}
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def _report(label: str, count: int, num_bytes: int, elapsed: float) -> None:
+    elapsed = max(elapsed, 1e-9)
+    print(f"[{label}] {count:,} chunks, {num_bytes / 1e6:.1f} MB in {elapsed:.2f}s "
+          f"({count / elapsed:,.0f} chunks/s, {num_bytes / 1e6 / elapsed:.1f} MB/s)")
+
+
+# --- Export ---
+def _write_part(out_dir: str, index: int, collection_name: str, ids: List[str], documents: List[str],
+                metadatas: List[Dict], embeddings: List[np.ndarray]) -> Dict:
+    filename = f"part-{index:05d}.npz"
+    packed_ids = _pack_strings(ids)
+    packed_docs = _pack_strings(documents)
+    packed_meta = _pack_strings([json.dumps(m or {}, ensure_ascii=False) for m in metadatas])
+    np.savez(
+        os.path.join(out_dir, filename),
+        embeddings=np.vstack(embeddings).astype(np.float32, copy=False),
+        ids_blob=packed_ids["blob"], ids_offsets=packed_ids["offsets"],
+        documents_blob=packed_docs["blob"], documents_offsets=packed_docs["offsets"],
+        metadatas_blob=packed_meta["blob"], metadatas_offsets=packed_meta["offsets"]
+    )
+    return {"file": filename, "collection": collection_name, "count": len(ids)}
+
+def export_memory(handler, out_dir: str, part_size: int = DEFAULT_PART_SIZE,
+                  page_size: int = DEFAULT_READ_PAGE) -> Dict:
+    """
+    Stream every memory shard of a ResponseHandler, and its ingested documents
+    collection if there is one, into out_dir.
+
+    The manifest is written last (atomically), so a directory without one is
+    an interrupted export and is refused by import_memory.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.monotonic()
+    manifest = {
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "exported_at": datetime.now().isoformat(),
+        "embedding_model": handler.embedding_model_name,
+        "dimension": None,
+        "collections": {},
+        "parts": []
+    }
+    total = 0
+
+    # Oldest shard first so an import recreates shards in chronological order
+    collections = [(name, "shard", handler._get_shard(name)) for name in reversed(handler._shard_names)]
+    documents_collection = handler._get_documents()
+    if documents_collection is not None:
+        collections.append((documents_collection.name, "documents", documents_collection))
+
+    for name, kind, collection in collections:
+        count = collection.count()
+        manifest["collections"][name] = {"count": count, "kind": kind, "metadata": collection.metadata}
+
+        buffer = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        for offset in range(0, count, page_size):
+            page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if manifest["dimension"] is None and len(embeddings):
+                manifest["dimension"] = int(embeddings.shape[1])
+            buffer["ids"].extend(page["ids"])
+            buffer["documents"].extend(doc or "" for doc in page["documents"])
+            buffer["metadatas"].extend(page["metadatas"])
+            buffer["embeddings"].append(embeddings)
+
+            while len(buffer["ids"]) >= part_size or (offset + page_size >= count and buffer["ids"]):
+                stacked = np.vstack(buffer["embeddings"])
+                take = min(part_size, len(buffer["ids"]))
+                manifest["parts"].append(_write_part(
+                    out_dir, len(manifest["parts"]), name,
+                    buffer["ids"][:take], buffer["documents"][:take],
+                    buffer["metadatas"][:take], [stacked[:take]]
+                ))
+                total += take
+                buffer = {
+                    "ids": buffer["ids"][take:],
+                    "documents": buffer["documents"][take:],
+                    "metadatas": buffer["metadatas"][take:],
+                    "embeddings": [stacked[take:]]
+                }
+
+    manifest_path = os.path.join(out_dir, MANIFEST_FILENAME)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    num_bytes = sum(os.path.getsize(os.path.join(out_dir, part["file"])) for part in manifest["parts"])
+    _report("Memory Export", total, num_bytes, time.monotonic() - started)
+    return manifest
+
+
+# --- Import ---
+def import_memory(handler, in_dir: str, batch_size: int = DEFAULT_IMPORT_BATCH) -> int:
+    """
+    Load an export produced by export_memory into a ResponseHandler's store.
+
+    Vectors are upserted as stored, so re-importing the same export is
+    idempotent. Returns the number of chunks imported.
+    """
+    with open(os.path.join(in_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format") != EXPORT_FORMAT or manifest.get("version") != EXPORT_VERSION:
+        raise ValueError(f"{in_dir} is not a supported memory export")
+    if manifest.get("embedding_model") != handler.embedding_model_name:
+        raise ValueError(
+            f"Export was embedded with {manifest.get('embedding_model')}, "
+            f"but this store uses {handler.embedding_model_name}"
+        )
+
+    # Chroma caps the size of a single write
+    max_batch = getattr(handler.client, "get_max_batch_size", lambda: batch_size)()
+    batch_size = min(batch_size, max_batch)
+
+    started = time.monotonic()
+    total = 0
+    num_bytes = 0
+    for part in manifest["parts"]:
+        path = os.path.join(in_dir, part["file"])
+        num_bytes += os.path.getsize(path)
+        with np.load(path) as data:
+            embeddings = data["embeddings"]
+            ids = _unpack_strings(data["ids_blob"], data["ids_offsets"])
+            documents = _unpack_strings(data["documents_blob"], data["documents_offsets"])
+            metadatas = [json.loads(m) or None for m in _unpack_strings(data["metadatas_blob"], data["metadatas_offsets"])]
+
+        # Recreate collections with their exported metadata so HNSW parameters survive the round trip
+        exported = manifest["collections"].get(part["collection"], {})
+        is_documents = exported.get("kind") == "documents"
+        if is_documents:
+            collection = handler._get_documents(create=True, metadata=exported.get("metadata"))
+        else:
+            collection = handler._get_shard(part["collection"], create=True, metadata=exported.get("metadata"))
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+        if not is_documents:
+            # Only chat memory is deduplicated on write
+            handler.register_chunks(part["collection"], documents, metadatas, ids)
+        total += len(ids)
+        print(f"[Memory Import] {part['file']} -> {collection.name} ({len(ids):,} chunks)")
+
+    _report("Memory Import", total, num_bytes, time.monotonic() - started)
+    return total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("export", "import"):
+        print("Usage: python -m utilities.memory_transfer [export|import] <directory>")
+        sys.exit(1)
+
+    from cognition_handler import ResponseHandler
+    memory = ResponseHandler()
+    if sys.argv[1] == "export":
+        export_memory(memory, sys.argv[2])
+    else:
+        import_memory(memory, sys.argv[2])
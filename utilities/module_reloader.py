@@ -0,0 +1,165 @@
+# utilities/module_reloader.py
+import os
+import sys
+import hashlib
+import inspect
+import importlib
+import traceback
+from typing import Dict, List, Optional
+
+from utilities.dynamic_importer import load_module_from_path
+
+EXPANSIVE_DIR = 'expansive'
+
+
+def _file_hash(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _max_positional(func) -> Optional[int]:
+    """Number of positional arguments func accepts (None if unlimited or unknown)."""
+    try:
+        parameters = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    count = 0
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            return None
+        if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            count += 1
+    return count
+
+
+class ModuleReloader:
+    """
+    Hot-reloads modules from the expansive directory between chat turns.
+
+    Each tracked module is checked by mtime first and content hash second, so
+    an unchanged file costs one stat() per turn. Changed modules are executed
+    as fresh module objects, handed the warm engine (ResponseHandler, HTTP
+    session, ...) through their optional attach_engine(engine) hook and smoke
+    checked. If any step fails the previous version stays active; otherwise
+    the replaced version's optional close() hook releases what it held (e.g.
+    worker threads).
+    """
+
+    def __init__(self, engine: Dict, watch_dir: str = EXPANSIVE_DIR):
+        self.engine = engine
+        self.watch_dir = watch_dir
+        self.modules: Dict[str, object] = {}
+        self.sources: Dict[str, str] = {}
+        self._required: Dict[str, List[str]] = {}
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._hashes: Dict[str, Optional[str]] = {}
+
+    def track(self, module_name: str, module: object, source: str, required: Optional[List[str]] = None) -> None:
+        """Start watching an already imported module and attach the engine to it."""
+        self.modules[module_name] = module
+        self.sources[module_name] = source
+        self._required[module_name] = required or []
+        path = self._expansive_path(module_name)
+        if os.path.exists(path):
+            self._mtimes[module_name] = os.stat(path).st_mtime_ns
+            self._hashes[module_name] = _file_hash(path)
+        else:
+            self._mtimes[module_name] = None
+            self._hashes[module_name] = None
+        self._attach(module)
+
+    def call(self, module_name: str, attr: str, *args):
+        """
+        Call a function of the active module version, dropping trailing arguments
+        it does not accept, so expansive modules written against an older
+        signature (e.g. enhance_prompt(prompt)) keep working.
+        """
+        func = getattr(self.modules[module_name], attr)
+        limit = _max_positional(func)
+        return func(*(args if limit is None else args[:limit]))
+
+    def _expansive_path(self, module_name: str) -> str:
+        return os.path.join(self.watch_dir, f"{module_name}.py")
+
+    def _attach(self, module: object) -> None:
+        attach = getattr(module, 'attach_engine', None)
+        if callable(attach):
+            attach(self.engine)
+
+    def _close(self, module: object) -> None:
+        close = getattr(module, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"[System] close() of a replaced module failed: {e}")
+
+    def _smoke_check(self, module_name: str, module: object) -> None:
+        """Raise if the module is missing required callables or its own smoke_check() fails."""
+        for attr in self._required[module_name]:
+            func = getattr(module, attr, None)
+            if not callable(func):
+                raise AttributeError(f"{module_name} does not define callable '{attr}'")
+            if _max_positional(func) == 0:
+                raise TypeError(f"{module_name}.{attr} takes no positional arguments")
+        smoke_check = getattr(module, 'smoke_check', None)
+        if callable(smoke_check):
+            smoke_check()
+
+    def poll(self) -> List[str]:
+        """
+        Check tracked modules for changes and reload those that changed.
+
+        Returns:
+            Names of the modules that were successfully swapped in.
+        """
+        reloaded = []
+        for module_name in list(self.modules):
+            path = self._expansive_path(module_name)
+            exists = os.path.exists(path)
+            mtime = os.stat(path).st_mtime_ns if exists else None
+            if mtime == self._mtimes[module_name]:
+                continue
+            self._mtimes[module_name] = mtime
+
+            # mtime moved but content may be identical (editor touch, git checkout)
+            content_hash = _file_hash(path) if exists else None
+            if content_hash == self._hashes[module_name]:
+                continue
+            self._hashes[module_name] = content_hash
+
+            if self._reload(module_name, path if exists else None):
+                reloaded.append(module_name)
+        return reloaded
+
+    def _reload(self, module_name: str, path: Optional[str]) -> bool:
+        """Swap in a new version of module_name, rolling back on any failure."""
+        previous = self.modules[module_name]
+        try:
+            if path:
+                module = load_module_from_path(f"{self.watch_dir}.{module_name}", path)
+                source = self.watch_dir
+            else:
+                # Expansive version was removed - fall back to the stable main version
+                module = sys.modules.get(module_name) or importlib.import_module(module_name)
+                source = 'main'
+            self._attach(module)
+            self._smoke_check(module_name, module)
+        except Exception:
+            print(f"\n[System] Reload of {module_name} failed, keeping previous version:")
+            print(traceback.format_exc().rstrip().splitlines()[-1])
+            # A version that imported but failed its checks is still registered - undo that
+            registry_key = f"{self.watch_dir}.{module_name}"
+            if self.sources[module_name] == self.watch_dir:
+                sys.modules[registry_key] = previous
+            else:
+                sys.modules.pop(registry_key, None)
+            return False
+
+        self.modules[module_name] = module
+        self.sources[module_name] = source
+        if previous is not module:
+            self._close(previous)
+        print(f"\n[System] Reloaded {source}/{module_name}.py")
+        return True
@@ -0,0 +1,123 @@
+# utilities/retrieval_orchestrator.py
+import re
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+# A source is called as search(query, expansions, max_results) and returns
+# results shaped like recall_memory's: {'content', 'metadata', 'score'}, plus an
+# optional 'relevance' ranked on instead of 'score' (e.g. recency-weighted)
+SearchFunc = Callable[[str, List[str], int], List[Dict]]
+
+# 'Speaker[timestamp]: ' prefix added to recalled chunks, ignored when comparing content
+_SPEAKER_PREFIX = re.compile(r'^[^\[\]\n:]*\[[^\]\n]*\]:\s*')
+# Shorter results are only dropped as exact repeats, never as part of a longer one
+MIN_CONTAINED_WORDS = 8
+
+
+def _comparable(content: str) -> str:
+    """Lowercased words of content, space separated, without its speaker prefix."""
+    return ' '.join(re.findall(r'\w+', _SPEAKER_PREFIX.sub('', content or '', count=1).lower()))
+
+
+class RetrievalOrchestrator:
+    """
+    Queries several context sources concurrently under one shared deadline and
+    merges their results in a single ranking pass.
+
+    Each source has its own single-worker pool (created once, so turns don't
+    churn threads), so a turn costs the slowest source that makes the deadline
+    rather than the sum of all of them. Sources that miss it are reported and
+    their late results discarded; a source still running from an earlier turn
+    is skipped instead of being queued twice.
+
+    Each result ranks by its source weight times its raw score clamped to 0-1,
+    so a result's rank does not depend on what else its source returned; the
+    weights calibrate the sources' score scales against each other. A source
+    may supply 'relevance' to rank on instead (chat memory's recency-weighted,
+    multi-query fused value). Results repeating a higher-ranked one, exactly or
+    as a run of at least MIN_CONTAINED_WORDS words inside it (e.g. a recalled
+    chunk of a journal message ranked above it), are dropped.
+    """
+
+    def __init__(self, deadline_ms: Optional[float] = 150):
+        self.deadline_ms = deadline_ms
+        self._sources: List[Tuple[str, SearchFunc, float]] = []
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._running: Dict[str, Future] = {}
+
+    def register_source(self, name: str, search: SearchFunc, weight: float = 1.0) -> None:
+        """Add a context source. Sources are started in registration order."""
+        self._sources = [source for source in self._sources if source[0] != name]
+        self._sources.append((name, search, weight))
+        if name not in self._pools:
+            self._pools[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"retrieve-{name}")
+
+    def close(self) -> None:
+        """Shut down the source workers; a search still running finishes in the background."""
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _rank_score(result: Dict, weight: float) -> float:
+        """Comparable score for one result: source weight x relevance (or score) clamped to 0-1."""
+        raw = result.get('relevance', result.get('score', 0.0))
+        return weight * min(max(float(raw), 0.0), 1.0)
+
+    @staticmethod
+    def _repeats(text: str, seen: List[str]) -> bool:
+        """True if text equals a higher-ranked result or is a long enough word run inside one."""
+        long_enough = text.count(' ') + 1 >= MIN_CONTAINED_WORDS
+        return any(text == other or (long_enough and f" {text} " in f" {other} ") for other in seen)
+
+    def retrieve(self, query: str, expansions: Optional[List[str]] = None, max_results: int = 5,
+                 per_source: int = 3) -> Tuple[List[Dict], List[str]]:
+        """
+        Run every source for this query and merge their results.
+
+        Returns:
+            A tuple of (results best first, names of sources that missed the
+            deadline). Each result gains 'source' and 'rank_score' keys.
+        """
+        expansions = expansions or []
+        missed = []
+
+        launched: Dict[str, Future] = {}
+        for name, search, _ in self._sources:
+            previous = self._running.get(name)
+            if previous is not None and not previous.done():
+                missed.append(name)  # Still busy with an earlier turn's query
+                continue
+            future = self._pools[name].submit(search, query, expansions, per_source)
+            self._running[name] = future
+            launched[name] = future
+
+        timeout = self.deadline_ms / 1000 if self.deadline_ms and self.deadline_ms > 0 else None
+        wait(launched.values(), timeout=timeout)
+
+        candidates = []
+        for name, _, weight in self._sources:
+            future = launched.get(name)
+            if future is None:
+                continue
+            if not future.done():
+                missed.append(name)
+                continue
+            error = future.exception()
+            if error is not None:
+                print(f"[Retrieval Warning] Source '{name}' failed: {error}")
+                continue
+            candidates.extend(dict(result, source=name, rank_score=self._rank_score(result, weight))
+                              for result in future.result() or [])
+
+        # Single ranking pass over every source
+        candidates.sort(key=lambda result: result['rank_score'], reverse=True)
+        merged, seen = [], []
+        for result in candidates:
+            text = _comparable(result.get('content', ''))
+            if text and self._repeats(text, seen):
+                continue
+            seen.append(text)
+            merged.append(result)
+            if len(merged) >= max_results:
+                break
+        return merged, missed
@@ -0,0 +1,167 @@
+# utilities/router_check.py
+"""
+Routing check for api_router.EndpointRouter against local stand-in servers.
+
+Exercises endpoint configuration, hedging away from a stalled primary,
+a hedge that loses to a merely slow primary, failover from an erroring
+endpoint, the all-failed error message, mid-stream cancellation and the
+first-token deadline. No network access or API key needed.
+
+Usage:
+    python -m utilities.router_check
+Exits with status 1 if any check fails.
+"""
+import sys
+import time
+from typing import Callable, List, Tuple
+
+import requests
+
+from api_router import EndpointRouter, MIN_TTFT_SAMPLES
+from utilities.latency_budget import CancelToken
+from utilities.standin_server import start_standin_server
+
+HISTORY = [{"role": "user", "content": "Hello"}]
+REPLY = "one two three four five"
+STALL_S = 5.0
+
+
+def _first_token(router: EndpointRouter) -> Tuple[float, str]:
+    """Seconds until the first chunk, and the full reply."""
+    started = time.monotonic()
+    first = None
+    chunks = []
+    for chunk in router.stream(HISTORY, "sk-check"):
+        if first is None:
+            first = time.monotonic() - started
+        chunks.append(chunk)
+    return (first if first is not None else float('inf')), "".join(chunks)
+
+
+def check_configuration(servers: List) -> None:
+    server_a, url_a = start_standin_server(reply=REPLY)
+    server_b, url_b = start_standin_server(reply=REPLY)
+    servers.extend([server_a, server_b])
+    router = EndpointRouter([{"url": url_a}, {"url": url_b}])
+    assert sorted(router.stats) == sorted([url_a, url_b]), f"unnamed endpoints share stats: {list(router.stats)}"
+    for endpoints in ([{"name": "no-url"}], [{"name": "x", "url": url_a}, {"name": "x", "url": url_b}]):
+        try:
+            EndpointRouter(endpoints)
+        except ValueError:
+            continue
+        raise AssertionError(f"invalid endpoints accepted: {endpoints}")
+
+
+def check_key_scoping(servers: List) -> None:
+    server, url = start_standin_server(reply=REPLY)
+    servers.append(server)
+    _first_token(EndpointRouter([{"name": "local", "url": url}]))
+    assert server.last_authorization is None, "global API key sent to a third-party endpoint"
+    _first_token(EndpointRouter([{"name": "local", "url": url, "api_key": "sk-local"}]))
+    assert server.last_authorization == "Bearer sk-local", server.last_authorization
+
+
+def check_hedging(servers: List) -> None:
+    primary, primary_url = start_standin_server(first_token_delay_s=0.02, stall_s=STALL_S, reply=REPLY)
+    backup, backup_url = start_standin_server(first_token_delay_s=0.1, reply=REPLY)
+    servers.extend([primary, backup])
+    router = EndpointRouter([{"name": "primary", "url": primary_url}, {"name": "backup", "url": backup_url}],
+                            requests.Session())
+    # Warm up so the hedge delay comes from the primary's own TTFT percentile
+    for _ in range(MIN_TTFT_SAMPLES + 1):
+        _first_token(router)
+    primary.behaviour["stall_rate"] = 1.0
+    for _ in range(5):
+        ttft, reply = _first_token(router)
+        assert reply.split() == REPLY.split(), f"incomplete reply: {reply!r}"
+        assert ttft < STALL_S / 4, f"stalled primary not hedged (TTFT {ttft:.2f}s)"
+    assert backup.request_count > 0
+
+
+def check_hedge_lost_by_backup(servers: List) -> None:
+    primary, primary_url = start_standin_server(first_token_delay_s=0.3, reply=REPLY)
+    backup, backup_url = start_standin_server(first_token_delay_s=1.2, reply=REPLY)
+    servers.extend([primary, backup])
+    router = EndpointRouter([{"name": "fast", "url": primary_url}, {"name": "slow", "url": backup_url}],
+                            requests.Session())
+    for _ in range(MIN_TTFT_SAMPLES + 1):
+        _first_token(router)
+    # One slow-ish primary response: the hedge fires, but the primary still wins
+    hedges = backup.request_count
+    primary.behaviour["first_token_delay_s"] = 0.45
+    _first_token(router)
+    assert backup.request_count > hedges, "hedge did not fire"
+    assert not router.stats["slow"].ttft, f"hedge that never sent a token got TTFT samples: {list(router.stats['slow'].ttft)}"
+    assert router.ranked_endpoints()[0]["name"] == "fast", "slow backup promoted to primary"
+    primary.behaviour["first_token_delay_s"] = 0.3
+    ttft, _ = _first_token(router)
+    assert ttft < 0.8, f"next request went to the slow backup (TTFT {ttft:.2f}s)"
+
+
+def check_failover(servers: List) -> None:
+    broken, broken_url = start_standin_server(error_rate=1.0)
+    healthy, healthy_url = start_standin_server(reply=REPLY)
+    servers.extend([broken, healthy])
+    router = EndpointRouter([{"name": "broken", "url": broken_url}, {"name": "healthy", "url": healthy_url}])
+    _, reply = _first_token(router)
+    assert reply.split() == REPLY.split(), f"no failover: {reply!r}"
+    assert router.stats_summary()["broken"]["errors"] >= 1
+
+    _, reply = _first_token(EndpointRouter([{"name": "broken", "url": broken_url}]))
+    assert reply.startswith("\nAPI request failed:"), f"unexpected error output: {reply!r}"
+
+
+def check_cancellation(servers: List) -> None:
+    server, url = start_standin_server(chunk_delay_s=0.2, reply=REPLY)
+    servers.append(server)
+    cancel_token = CancelToken()
+    stream = EndpointRouter([{"name": "slow", "url": url}]).stream(HISTORY, "sk-check", cancel_token)
+    next(stream)
+    started = time.monotonic()
+    cancel_token.cancel("user interrupt")
+    rest = list(stream)
+    assert time.monotonic() - started < 1.0, "cancel did not stop the stream promptly"
+    assert len(rest) <= 1, f"stream continued after cancel: {rest}"
+
+
+def check_first_token_deadline(servers: List) -> None:
+    server, url = start_standin_server(stall_rate=1.0, stall_s=STALL_S)
+    servers.append(server)
+    router = EndpointRouter([{"name": "stalled", "url": url}], budgets={"first_token_budget_s": 0.5})
+    cancel_token = CancelToken()
+    started = time.monotonic()
+    chunks = list(router.stream(HISTORY, "sk-check", cancel_token))
+    elapsed = time.monotonic() - started
+    assert not chunks and cancel_token.reason == "first-token deadline", (chunks, cancel_token.reason)
+    assert elapsed < 1.5, f"deadline overran ({elapsed:.2f}s)"
+
+
+CHECKS: List[Tuple[str, Callable[[List], None]]] = [
+    ("endpoint configuration", check_configuration),
+    ("API key scoping", check_key_scoping),
+    ("hedging a stalled primary", check_hedging),
+    ("hedge that lost to the primary", check_hedge_lost_by_backup),
+    ("failover from an erroring endpoint", check_failover),
+    ("mid-stream cancellation", check_cancellation),
+    ("first-token deadline", check_first_token_deadline),
+]
+
+
+def run_checks() -> bool:
+    passed = True
+    for name, check in CHECKS:
+        servers = []
+        try:
+            check(servers)
+            print(f"[Router Check] PASS {name}")
+        except AssertionError as e:
+            passed = False
+            print(f"[Router Check] FAIL {name}: {e}")
+        finally:
+            for server in servers:
+                server.shutdown()
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
@@ -0,0 +1,312 @@
+# utilities/session_journal.py
+import os
+import json
+import struct
+from datetime import datetime
+from typing import List, Dict, Tuple, Optional
+
+from utilities.token_counter import count_single_message_tokens
+
+# --- Constants ---
+DEFAULT_JOURNAL_DIR = "sessions"
+LOG_FILENAME = "journal.log"      # Append-only, one JSON message per line (source of truth)
+INDEX_FILENAME = "journal.idx"    # Fixed-size records pointing into the log
+
+# Index record: byte offset (8), line length (4), session number (4), token count (4)
+INDEX_RECORD = struct.Struct("<QIII")
+INDEX_READ_BLOCK = 256  # Records read per backwards seek when restoring
+SEARCH_SNIPPET_CHARS = 600  # Longest message text returned by search()
+
+
+class SessionJournal:
+    """
+    Append-only on-disk journal of conversation messages.
+
+    Every message is written to the log as a single JSON line together with its
+    precomputed token count. A parallel index of fixed-size records stores the
+    offset, length, session and token count of each line, so restoring the tail
+    of the most recent sessions only seeks to the end of the index and reads the
+    selected byte range of the log - nothing is re-parsed or re-tokenised.
+    """
+
+    def __init__(self, journal_dir: str = DEFAULT_JOURNAL_DIR, max_bytes: Optional[int] = None,
+                 keep_sessions: int = 20):
+        os.makedirs(journal_dir, exist_ok=True)
+        self.log_path = os.path.join(journal_dir, LOG_FILENAME)
+        self.index_path = os.path.join(journal_dir, INDEX_FILENAME)
+        # Log offset of the first message restore() put back into the live history
+        self._restored_from: Optional[int] = None
+
+        self._recover()
+        if max_bytes and os.path.getsize(self.log_path) > max_bytes:
+            self.compact(keep_sessions)
+
+        # Each run of the program gets its own session number
+        last = self._last_record()
+        self.session = (last[2] + 1) if last else 1
+
+    # --- Crash recovery ---
+    def _recover(self) -> None:
+        """
+        Bring the log and index back into agreement after an interrupted write.
+
+        The log is the source of truth: a torn trailing line is cut off, and any
+        complete lines the index does not yet know about are re-indexed.
+        """
+        for path in (self.log_path, self.index_path):
+            if not os.path.exists(path):
+                open(path, 'ab').close()
+
+        log_size = os.path.getsize(self.log_path)
+        index_size = os.path.getsize(self.index_path)
+        valid_records = index_size // INDEX_RECORD.size
+
+        # Drop partial index records and records pointing past the end of the log
+        with open(self.index_path, 'rb') as idx:
+            while valid_records:
+                idx.seek((valid_records - 1) * INDEX_RECORD.size)
+                offset, length, _, _ = INDEX_RECORD.unpack(idx.read(INDEX_RECORD.size))
+                if offset + length <= log_size:
+                    break
+                valid_records -= 1
+        if valid_records * INDEX_RECORD.size != index_size:
+            with open(self.index_path, 'r+b') as idx:
+                idx.truncate(valid_records * INDEX_RECORD.size)
+
+        last = self._last_record()
+        indexed_end = (last[0] + last[1]) if last else 0
+        if indexed_end == log_size:
+            return
+
+        # Re-index complete lines written after the last index record
+        new_records = []
+        end = indexed_end
+        with open(self.log_path, 'rb') as log:
+            log.seek(indexed_end)
+            for line in log:
+                if not line.endswith(b'\n'):
+                    break  # Torn write - the line never finished
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                new_records.append(INDEX_RECORD.pack(end, len(line), entry['s'], entry['tokens']))
+                end += len(line)
+
+        if end != log_size:
+            with open(self.log_path, 'r+b') as log:
+                log.truncate(end)
+            print(f"[Journal] Discarded {log_size - end} bytes of incomplete data")
+        if new_records:
+            with open(self.index_path, 'ab') as idx:
+                idx.write(b''.join(new_records))
+                idx.flush()
+                os.fsync(idx.fileno())
+
+    def _last_record(self) -> Optional[Tuple[int, int, int, int]]:
+        """Return the final index record, or None for an empty journal."""
+        size = os.path.getsize(self.index_path)
+        if size < INDEX_RECORD.size:
+            return None
+        with open(self.index_path, 'rb') as idx:
+            idx.seek(size - INDEX_RECORD.size)
+            return INDEX_RECORD.unpack(idx.read(INDEX_RECORD.size))
+
+    def _iter_records_backwards(self):
+        """Yield index records from newest to oldest, reading the index in blocks."""
+        with open(self.index_path, 'rb') as idx:
+            remaining = os.path.getsize(self.index_path) // INDEX_RECORD.size
+            while remaining:
+                count = min(INDEX_READ_BLOCK, remaining)
+                remaining -= count
+                idx.seek(remaining * INDEX_RECORD.size)
+                block = idx.read(count * INDEX_RECORD.size)
+                records = list(INDEX_RECORD.iter_unpack(block))
+                yield from reversed(records)
+
+    # --- Writing ---
+    def append(self, message: Dict[str, str], tokens: Optional[int] = None) -> None:
+        """
+        Durably append one message to the current session.
+
+        The log line is fsynced before its index record is written, so a crash
+        at any point leaves at worst an unindexed line that _recover() picks up.
+        """
+        if tokens is None:
+            tokens = count_single_message_tokens(message)
+        entry = {
+            "s": self.session,
+            "ts": datetime.now().isoformat(),
+            "role": message["role"],
+            "content": message["content"],
+            "tokens": tokens
+        }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+
+        with open(self.log_path, 'ab') as log:
+            offset = log.tell()
+            log.write(line)
+            log.flush()
+            os.fsync(log.fileno())
+        with open(self.index_path, 'ab') as idx:
+            idx.write(INDEX_RECORD.pack(offset, len(line), self.session, tokens))
+            idx.flush()
+            os.fsync(idx.fileno())
+
+    # --- Reading ---
+    def restore(self, max_sessions: int = 1, max_tokens: int = 3000) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Restore the tail of the last `max_sessions` sessions.
+
+        Walks the index backwards, keeping the newest messages whose stored token
+        counts fit in `max_tokens`, then reads that byte range of the log in one
+        seek. The restored messages are excluded from later search() results,
+        since they are already in the conversation history.
+
+        Returns:
+            A tuple of (messages oldest-first, total token count of those messages).
+        """
+        if max_sessions <= 0 or max_tokens <= 0:
+            return [], 0
+
+        selected = []
+        sessions_seen = set()
+        total_tokens = 0
+        for offset, length, session, tokens in self._iter_records_backwards():
+            if session not in sessions_seen and len(sessions_seen) >= max_sessions:
+                break
+            if total_tokens + tokens > max_tokens:
+                break
+            sessions_seen.add(session)
+            selected.append((offset, length, tokens))
+            total_tokens += tokens
+
+        if not selected:
+            return [], 0
+
+        selected.reverse()
+        start = selected[0][0]
+        end = selected[-1][0] + selected[-1][1]
+        with open(self.log_path, 'rb') as log:
+            log.seek(start)
+            data = log.read(end - start)
+
+        messages = []
+        for offset, length, tokens in selected:
+            entry = json.loads(data[offset - start:offset - start + length])
+            messages.append({"role": entry["role"], "content": entry["content"]})
+
+        # Never resume on an orphaned assistant reply - history should start with a user turn
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+            total_tokens -= selected.pop(0)[2]
+        # ...or end on a prompt whose reply was never journalled (crash between the two appends),
+        # which would put two user messages in a row once the next prompt is added
+        if messages and messages[-1]["role"] == "user":
+            messages.pop()
+            total_tokens -= selected.pop()[2]
+
+        if selected:
+            self._restored_from = selected[0][0]
+        return messages, total_tokens
+
+    def search(self, terms: List[str], max_results: int = 3, scan_records: int = 1000,
+               min_overlap: float = 0.5, skip_session: Optional[int] = None) -> List[Dict]:
+        """
+        Keyword search over the newest `scan_records` messages of earlier sessions,
+        skipping messages restore() already put back into the history.
+
+        The selected records are contiguous in the log, so their byte range is
+        read with one seek. A message scores the fraction of `terms` it contains;
+        newer messages win ties.
+
+        Returns:
+            Results shaped like ResponseHandler.recall_memory's, best first.
+        """
+        terms = [term.lower() for term in terms if term]
+        if not terms or max_results <= 0:
+            return []
+        skip_session = self.session if skip_session is None else skip_session
+
+        selected = []
+        for offset, length, session, _ in self._iter_records_backwards():
+            if len(selected) >= scan_records:
+                break
+            if session == skip_session:
+                continue
+            if self._restored_from is not None and offset >= self._restored_from:
+                continue
+            selected.append((offset, length))
+        if not selected:
+            return []
+
+        start = selected[-1][0]
+        end = selected[0][0] + selected[0][1]
+        with open(self.log_path, 'rb') as log:
+            log.seek(start)
+            data = log.read(end - start)
+
+        scored = []
+        for age, (offset, length) in enumerate(selected):
+            line = data[offset - start:offset - start + length]
+            content = line.decode('utf-8', errors='replace').lower()
+            matched = sum(1 for term in terms if term in content)  # Cheap pre-filter on the raw line
+            if matched / len(terms) < min_overlap:
+                continue
+            entry = json.loads(line)
+            text = entry["content"].lower()
+            matched = sum(1 for term in terms if term in text)
+            if matched / len(terms) >= min_overlap:
+                scored.append((matched / len(terms), -age, entry))
+
+        scored.sort(key=lambda item: item[:2], reverse=True)
+        results = []
+        for score, _, entry in scored[:max_results]:
+            snippet = entry['content']
+            if len(snippet) > SEARCH_SNIPPET_CHARS:
+                snippet = snippet[:SEARCH_SNIPPET_CHARS].rstrip() + "..."
+            results.append({
+                'content': f"{entry['role'].capitalize()}[{entry['ts']}]: {snippet}",
+                'metadata': {'content_type': 'journal', 'role': entry['role'],
+                             'timestamp': entry['ts'], 'session': entry['s']},
+                'score': score
+            })
+        return results
+
+    # --- Maintenance ---
+    def compact(self, keep_sessions: int = 20) -> None:
+        """
+        Rewrite the journal keeping only the newest `keep_sessions` sessions.
+
+        The index is removed before the log is swapped in, so a crash mid-way
+        leaves a log that _recover() simply re-indexes on the next start.
+        """
+        cut_offset = None
+        sessions_seen = set()
+        for offset, _, session, _ in self._iter_records_backwards():
+            if session not in sessions_seen and len(sessions_seen) >= keep_sessions:
+                break
+            sessions_seen.add(session)
+            cut_offset = offset
+        if not cut_offset:
+            return  # Nothing to drop
+
+        tmp_log_path = self.log_path + ".tmp"
+        with open(self.log_path, 'rb') as src, open(tmp_log_path, 'wb') as dst:
+            src.seek(cut_offset)
+            while True:
+                block = src.read(1 << 20)
+                if not block:
+                    break
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        old_size = os.path.getsize(self.log_path)
+        os.remove(self.index_path)
+        os.replace(tmp_log_path, self.log_path)
+        if self._restored_from is not None:
+            self._restored_from = max(self._restored_from - cut_offset, 0)
+        self._recover()
+        print(f"[Journal] Compacted {old_size} -> {os.path.getsize(self.log_path)} bytes "
+              f"(kept last {len(sessions_seen)} sessions)")
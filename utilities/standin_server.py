@@ -0,0 +1,105 @@
+# utilities/standin_server.py
+"""
+Local stand-in for an OpenAI-compatible streaming chat completions endpoint.
+
+Lets the router, latency budgets and soak runs be exercised without network
+access or API credits. Behaviour (first-token delay, occasional stalls,
+failures) is configurable per server.
+
+Usage:
+    python -m utilities.standin_server [port] [first_token_delay_s] [stall_rate]
+"""
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+DEFAULT_BEHAVIOUR = {
+    "first_token_delay_s": 0.05,  # Delay before the first chunk
+    "chunk_delay_s": 0.0,         # Delay between chunks
+    "stall_rate": 0.0,            # Fraction of requests whose first token is delayed by stall_s
+    "stall_s": 5.0,
+    "error_rate": 0.0,            # Fraction of requests answered with HTTP 503
+    "reply": "This is a stand-in response. It streams word by word like the real API."
+}
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection pooling behaves like the real API
+
+    def log_message(self, format, *args):
+        pass  # Keep the chat terminal quiet
+
+    def do_POST(self):
+        behaviour = self.server.behaviour
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.request_count += 1
+        self.server.last_authorization = self.headers.get("Authorization")
+
+        if random.random() < behaviour["error_rate"]:
+            body = b'{"error": "stand-in overloaded"}'
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        delay = behaviour["first_token_delay_s"]
+        if random.random() < behaviour["stall_rate"]:
+            delay = behaviour["stall_s"]
+        time.sleep(delay)
+
+        try:
+            for word in behaviour["reply"].split(" "):
+                event = {"choices": [{"delta": {"content": word + " "}}], "model": request.get("model")}
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                if behaviour["chunk_delay_s"]:
+                    time.sleep(behaviour["chunk_delay_s"])
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client cancelled the stream
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_standin_server(port: int = 0, **behaviour) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start a stand-in server on a background thread.
+
+    Returns:
+        The server (call .shutdown() to stop it) and its chat completions URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _StandInHandler)
+    server.daemon_threads = True
+    server.behaviour = {**DEFAULT_BEHAVIOUR, **behaviour}
+    server.request_count = 0
+    server.last_authorization = None  # Authorization header of the latest request
+    threading.Thread(target=server.serve_forever, daemon=True, name="standin-server").start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    port = int(args[0]) if len(args) > 0 else 8001
+    first_token_delay = float(args[1]) if len(args) > 1 else DEFAULT_BEHAVIOUR["first_token_delay_s"]
+    stall_rate = float(args[2]) if len(args) > 2 else 0.0
+    server, url = start_standin_server(port, first_token_delay_s=first_token_delay, stall_rate=stall_rate)
+    print(f"[Stand-in] Serving {url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
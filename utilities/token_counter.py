@@ -44,6 +44,14 @@ def count_message_tokens(messages: List[Dict[str, str]], model: str = DEFAULT_MO
     num_tokens += 3
     return num_tokens
 
+def count_single_message_tokens(message: Dict[str, str], model: str = DEFAULT_MODEL_FOR_TOKENIZER) -> int:
+    """
+    Returns the token cost of one message inside a history, i.e. without the
+    reply-priming tokens that count_message_tokens adds once per request.
+    Used to precompute per-message counts for the session journal.
+    """
+    return count_message_tokens([message], model) - 3
+
 # --- Main Truncation Function ---
 def truncate_history_by_tokens(
     history: List[Dict[str, str]],
@@ -54,7 +62,8 @@ def truncate_history_by_tokens(
     Truncates conversation history if it exceeds max_tokens.
 
     Removes the oldest pair of messages (assumed user/assistant)
-    until the total token count is within the limit.
+    until the total token count is within the limit. A leading system
+    message and the newest message are never removed.
 
     Args:
         history: The list of message dictionaries.
@@ -67,14 +76,16 @@ def truncate_history_by_tokens(
         - The final token count of the returned history.
     """
     current_tokens = count_message_tokens(history, model_name)
+    # The system message stays at index 0 (the chat loop rewrites it every turn)
+    first = 1 if history and history[0].get('role') == 'system' else 0
 
     # Check if history needs truncation
     while current_tokens > max_tokens:
-        if len(history) >= 2:
-            # Remove the oldest message (index 0) and the next oldest (new index 0)
+        if len(history) - first >= 3:
+            # Remove the oldest message after the system message and the next oldest.
             # This assumes the oldest messages are a user/assistant pair.
-            removed_msg1 = history.pop(0)
-            removed_msg2 = history.pop(0)
+            removed_msg1 = history.pop(first)
+            removed_msg2 = history.pop(first)
             print(f"[History Truncation] Token limit ({max_tokens}) exceeded ({current_tokens}). Removing oldest pair:")
             print(f"  - Removed: {removed_msg1['role']}: {removed_msg1['content'][:50]}...")
             print(f"  - Removed: {removed_msg2['role']}: {removed_msg2['content'][:50]}...")
@@ -83,8 +94,8 @@ def truncate_history_by_tokens(
             current_tokens = count_message_tokens(history, model_name)
             print(f"[History Truncation] New token count: {current_tokens}. History length: {len(history)}")
         else:
-            # Cannot remove a pair if fewer than 2 messages are left.
-            print(f"[History Truncation] Warning: Cannot truncate further (less than 2 messages left) even though token limit ({max_tokens}) is exceeded ({current_tokens}).")
+            # Cannot remove a pair without touching the system message or the newest message.
+            print(f"[History Truncation] Warning: Cannot truncate further (no removable pair left) even though token limit ({max_tokens}) is exceeded ({current_tokens}).")
             break # Exit the loop
 
     # Return the modified history and its final token count